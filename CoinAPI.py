@@ -2,10 +2,24 @@
 # using the REST portion of coinAPI.io.  Various functions within the class can also
 # open and save coinAPI.io response objects for later use.  Files are saved in a 
 # predetermined folder structure as mapped out in www.github.com/JackNelson/Capstone 
-import dateutil
+import csv
+import dateutil.parser
+import dateutil.relativedelta
+import dateutil.tz
+import gzip
+import heapq
+import itertools
 import json
+import os
+import random
 import requests
-from googletrans import Translator
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from ResponseCache import ResponseCache
+from TweetTranslator import BatchTranslator
 
 # Custom exception handling for non-successful http requests to coinAPI.io (status_code != 200)
 class UnsuccessfulRequest(Exception):
@@ -16,19 +30,264 @@ class UnsuccessfulRequest(Exception):
             
             self.status_code = status_code
             self.status_response = responses.get(int(status_code))
+
+# Scheduler that runs coinAPI requests in priority order while spending the request budget tracked in
+# CoinAPI.request_limits.  429/5xx responses are retried with jittered exponential backoff, and requests
+# pause until X-RateLimit-Reset once the remaining budget cannot cover the next request's cost.  The queue
+# is shared by every thread using the same CoinAPI object: worker threads started by any run() call take
+# the lowest priority call queued by any caller, so e.g. a price backfill submitted at priority 0 goes
+# ahead of a tweet backfill running at priority 5 in another thread
+class RequestScheduler:
+    # RequestScheduler(api = CoinAPI object, max_retries = int, backoff = float, max_backoff = float)
+    # backoff and max_backoff: base and ceiling (seconds) of the retry delay, doubled on each attempt
+    def __init__(self, api, max_retries=5, backoff=1.0, max_backoff=60.0):
+        self.api = api
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        
+        # heap of (priority, sequence, function, args), sequence keeps equal priorities first in, first out
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # notified whenever a queued call finishes, so callers can wait on calls run by other threads
+        self._finished = threading.Condition(self._lock)
+        # tickets submitted and not yet returned or cancelled, and ticket : (succeeded, result or exception)
+        self._pending = set()
+        self._results = {}
+        # tickets each thread submitted since its last run()
+        self._local = threading.local()
+        self._pause_until = 0.0
+        self._throttled_until = 0.0
+        self._inflight_cost = 0
+        
+        self.stats = {'requests': 0, 'retries': 0, 'cost': 0, 'throttled_seconds': 0.0, 'started': None}
+    
+    # External function that queues a call to run through the scheduler, returns ticket used to key run() results
+    # submit(function = callable, args = tuple, priority = int) <-lower priority values run first
+    def submit(self, function, args=(), priority=0):
+        with self._lock:
+            ticket = next(self._sequence)
+            heapq.heappush(self._queue, (priority, ticket, function, args))
+            self._pending.add(ticket)
+        if not hasattr(self._local, 'tickets'):
+            self._local.tickets = []
+        self._local.tickets.append(ticket)
+        return ticket
+    
+    # External function that runs queued calls in priority order with a bounded number of worker threads until
+    # the caller's calls have finished (calls queued by other threads may be run along the way)
+    # run(workers = int, tickets = list of ints), returns dictionary of ticket : result
+    # tickets optional, defaulted to tickets submitted by the calling thread since its last run()
+    # when a call raises, the caller's calls still queued are cancelled and the first error is raised
+    def run(self, workers=1, tickets=None):
+        submitted = getattr(self._local, 'tickets', [])
+        if tickets is None:
+            tickets = submitted
+        self._local.tickets = [ticket for ticket in submitted if ticket not in set(tickets)]
+        with self._lock:
+            # tickets already returned or cancelled have nothing left to wait for
+            tickets = [ticket for ticket in tickets if ticket in self._pending]
+        
+        def finished():
+            # every ticket done, or one of them failed
+            done = [ticket for ticket in tickets if ticket in self._results]
+            return len(done) == len(tickets) or any(not self._results[ticket][0] for ticket in done)
+        
+        def worker():
+            while True:
+                with self._lock:
+                    while not finished() and not self._queue:
+                        # remaining calls are being run by other threads
+                        self._finished.wait()
+                    if finished():
+                        return
+                    priority, ticket, function, args = heapq.heappop(self._queue)
+                try:
+                    outcome = (True, function(*args))
+                except Exception as e:
+                    outcome = (False, e)
+                with self._lock:
+                    # results of cancelled calls are dropped
+                    if ticket in self._pending:
+                        self._results[ticket] = outcome
+                    self._finished.notify_all()
+        
+        threads = [threading.Thread(target=worker) for i in range(max(1, min(workers, len(tickets))))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        with self._lock:
+            outcomes = [(ticket, self._results.pop(ticket, None)) for ticket in tickets]
+            self._pending.difference_update(tickets)
+            errors = [outcome[1] for ticket, outcome in outcomes if outcome is not None and not outcome[0]]
+            if errors:
+                # cancel the caller's calls that have not started so they never spend request quota
+                cancelled = set(tickets)
+                self._queue = [task for task in self._queue if task[1] not in cancelled]
+                heapq.heapify(self._queue)
+        if errors:
+            raise errors[0]
+        return dict((ticket, outcome[1]) for ticket, outcome in outcomes)
+    
+    # External function that executes a single GET request, retrying rate limited and server error responses
+    # request(url = string)
+    def request(self, url):
+        for attempt in range(self.max_retries + 1):
+            cost = self._acquire()
+            try:
+                response_object = self.api.session.get(url)
+            finally:
+                with self._lock:
+                    self._inflight_cost -= cost
             
-            self.translator = Translator()
+            self.api._updateRequestLimits(response_object)
+            self._record(response_object)
+            
+            status_code = int(response_object.status_code)
+            if (status_code == 429 or status_code >= 500) and attempt < self.max_retries:
+                with self._lock:
+                    self.stats['retries'] += 1
+                self._pause(self._retryDelay(response_object, attempt))
+            else:
+                break
+        
+        self.api._responseCheck(response_object)
+        return json.loads(response_object.text)
+    
+    # External function that returns scheduler counters along with request throughput (requests per second)
+    def getStats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        if stats['started'] is not None:
+            elapsed = time.time() - stats['started']
+            stats['throughput'] = stats['requests'] / elapsed if elapsed > 0 else 0.0
+        else:
+            stats['throughput'] = 0.0
+        return stats
+    
+    # Internal function that blocks until a pause has elapsed and the budget covers the next request
+    # returns estimated cost reserved for the request
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if self.stats['started'] is None:
+                    self.stats['started'] = time.time()
+                cost = self._requestCost()
+                wait = self._pause_until - time.time()
+                if wait <= 0:
+                    remaining = self._limit('X-RateLimit-Remaining')
+                    if remaining is not None and remaining - self._inflight_cost < cost:
+                        # budget exhausted, hold every request until the key's limits reset
+                        wait = self._secondsUntilReset()
+                        self._pause_until = time.time() + wait
+                if wait <= 0:
+                    self._inflight_cost += cost
+                    return cost
+            self._sleep(wait)
+    
+    # Internal function that pauses all requests for a number of seconds
+    # _pause(seconds = float)
+    def _pause(self, seconds):
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.time() + seconds)
+    
+    # Internal function that sleeps and records the time spent throttled
+    # threads usually wait out the same pause, so only time not already counted by another thread is added
+    # _sleep(seconds = float)
+    def _sleep(self, seconds):
+        with self._lock:
+            start = time.time()
+            end = start + seconds
+            self.stats['throttled_seconds'] += max(0.0, end - max(start, self._throttled_until))
+            self._throttled_until = max(self._throttled_until, end)
+        time.sleep(seconds)
+    
+    # Internal function that records request count and cost from response headers
+    # _record(response_object = coinAPI response object)
+    def _record(self, response_object):
+        with self._lock:
+            self.stats['requests'] += 1
+            try:
+                self.stats['cost'] += int(response_object.headers.get('X-RateLimit-Request-Cost', 0))
+            except ValueError:
+                pass
+    
+    # Internal function that determines how long to wait before retrying a response
+    # _retryDelay(response_object = coinAPI response object, attempt = int)
+    def _retryDelay(self, response_object, attempt):
+        # an exhausted key will not recover until the reset time given by coinAPI
+        if int(response_object.status_code) == 429 and self._limit('X-RateLimit-Remaining') == 0:
+            reset = self._secondsUntilReset()
+            if reset > 0:
+                return reset
+        retry_after = response_object.headers.get('Retry-After')
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        # exponential backoff with jitter so concurrent workers do not retry in lockstep
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    # Internal function that returns the cost of the next request, defaulted to 1 until coinAPI reports one
+    def _requestCost(self):
+        cost = self._limit('X-RateLimit-Request-Cost')
+        return cost if cost else 1
+    
+    # Internal function that returns a numeric request limit value or None when unknown
+    # _limit(header = string)
+    def _limit(self, header):
+        try:
+            return int(self.api.request_limits[header])
+        except (KeyError, TypeError, ValueError):
+            return None
+    
+    # Internal function that returns seconds remaining until X-RateLimit-Reset (0 if unknown or passed)
+    def _secondsUntilReset(self):
+        reset = self.api.request_limits.get('X-RateLimit-Reset')
+        if not reset:
+            return 0.0
+        try:
+            reset_date = dateutil.parser.parse(reset)
+        except (TypeError, ValueError):
+            return 0.0
+        if reset_date.tzinfo is None:
+            reset_date = reset_date.replace(tzinfo=dateutil.tz.tzutc())
+        return max(0.0, (reset_date - datetime.now(dateutil.tz.tzutc())).total_seconds())
 
 class CoinAPI:
-    def __init__(self, key):
+    # url_stem optional, defaulted to coinAPI.io REST endpoint, can be pointed at a local stub server for testing
+    # max_workers optional, defaulted to 8, upper bound on concurrent requests (also sizes the connection pool)
+    # cache optional, defaulted to on-disk ResponseCache in data/api_cache, None disables response caching
+    # translator optional, defaulted to BatchTranslator over googletrans (created on first use)
+    def __init__(self, key, url_stem='https://rest.coinapi.io/v1', max_workers=8, cache='default', translator=None):
         # set headers and url stem used for all requests within coinAPI
         self.key = key
         self.headers = {'X-CoinAPI-Key' : self.key}
-        self._url_stem = 'https://rest.coinapi.io/v1'
+        self._url_stem = url_stem
+        self.max_workers = max_workers
+        
+        # single keep-alive session shared by all requests so TCP/TLS connections are reused
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
         # initializing request limits for specific API Key - defaults to Free API Key Limits 
         self.request_limits = {'X-RateLimit-Limit': 100, 'X-RateLimit-Remaining': 100, 
                                'X-RateLimit-Request-Cost' : 0, 'X-RateLimit-Reset' : None}
+        
+        # scheduler all requests pass through for retries, throttling and priority ordering
+        self.scheduler = RequestScheduler(self)
+        
+        # on-disk cache of historical responses so repeat backfills do not spend request quota
+        if cache == 'default':
+            cache = ResponseCache()
+        self.cache = cache
+        
+        self.translator = translator
        
     # External function that returns historical OHLCV information related to a specific cryptocurrency
     # getHistOHLCV(symbol_id = string, period_id = string, time_start = string, time_end = string, limit = int)
@@ -41,15 +300,60 @@ class CoinAPI:
             url = self._url_stem+'/ohlcv/'+symbol_id+'/history?period_id='+period_id+'&time_start='+time_start+'&limit='+str(limit)
         else:
             url = self._url_stem+'/ohlcv/'+symbol_id+'/history?period_id='+period_id+'&time_start='+time_start+'&time_end='+time_end+'&limit='+str(limit)           
-        response_object = requests.get(url, headers=self.headers)
+        # returning only the price objects within REST API response object
+        return self._cachedGet(url, {'endpoint': 'ohlcv', 'symbol_id': symbol_id, 'period_id': period_id, 
+                                     'time_start': time_start, 'time_end': time_end, 'limit': limit})
+    
+    # External function that streams historical OHLCV rows over any time range as a generator
+    # iterHistOHLCV(symbol_id = string, time_start = string, time_end = string, period_id = string, limit = int, workers = int)
+    # range [time_start, time_end) is split into pages of limit periods, pages are requested workers at a time
+    # limit optional, defaulted to 100, periods per page (each multiple of 100 counts as a request with coinAPI)
+    # workers optional, defaulted to 4, number of pages requested concurrently
+    # rows are yielded in time order with duplicate time_period_start values removed across page boundaries
+    # times follow ISO 8601 time format (YYYY-MM-DDThh:mm:ss)
+    def iterHistOHLCV(self, symbol_id, time_start, time_end, period_id='1DAY', limit=100, workers=4):
+        pages = self._getPages(time_start, time_end, period_id, limit)
+        last_period_start = None
         
-        self._responseCheck(response_object)
-        self._updateRequestLimits(response_object)
-        # returning only the tweet objects within REST API response object
-        return json.loads(response_object.text)
+        while True:
+            # take next batch of pages so only workers pages of rows are held in memory at once
+            batch = list(itertools.islice(pages, self._concurrencyLimit(workers)))
+            if not batch:
+                break
+            tickets = [self.scheduler.submit(self.getHistOHLCV, (symbol_id, page_start, period_id, page_end, limit)) 
+                       for page_start, page_end in batch]
+            results = self.scheduler.run(len(batch), tickets)
+            
+            for ticket in tickets:
+                for price in sorted(results.pop(ticket), key=lambda price: price['time_period_start']):
+                    if last_period_start is None or price['time_period_start'] > last_period_start:
+                        last_period_start = price['time_period_start']
+                        yield price
+    
+    # Internal function that lazily splits a time range into (page_start, page_end) ranges of limit periods
+    # _getPages(time_start = string, time_end = string, period_id = string, limit = int)
+    def _getPages(self, time_start, time_end, period_id, limit):
+        page_length = self._periodLength(period_id) * limit
+        start_date = dateutil.parser.parse(time_start)
+        end_date = dateutil.parser.parse(time_end)
+        
+        while start_date < end_date:
+            page_end = min(start_date + page_length, end_date)
+            yield start_date.strftime('%Y-%m-%dT%H:%M:%S'), page_end.strftime('%Y-%m-%dT%H:%M:%S')
+            start_date = page_end
+    
+    # Internal function that converts a coinAPI period_id (e.g. 1MIN, 4HRS, 1DAY, 1MTH) into a relativedelta
+    # _periodLength(period_id = string)
+    def _periodLength(self, period_id):
+        units = {'SEC': 'seconds', 'MIN': 'minutes', 'HRS': 'hours', 'DAY': 'days', 'MTH': 'months', 'YRS': 'years'}
+        count, unit = period_id[:-3], period_id[-3:]
+        if unit not in units or not count.isdigit():
+            raise ValueError("Unrecognized period_id: " + period_id)
+        return dateutil.relativedelta.relativedelta(**{units[unit]: int(count)})
         
-    # Internal function that writes .txt containing VADER sentiment results for each tweet
-    # _writeSentiment(filename = string)
+    # Internal function that writes .txt containing OHLCV price information for each period
+    # prices can be a list from getHistOHLCV or the generator from iterHistOHLCV
+    # _writeHistOHLCV(filename = string, prices = iterable of price objects)
     def _writeHistOHLCV(self, filename, prices):
         # construct folder path where files to be written
         path = 'data/price_data/' + filename
@@ -67,28 +371,128 @@ class CoinAPI:
             outfile.close()
     
     # External function that loops through historical tweets function and returns list of tweets
-    # loopHistTweets(time_start = string, loops = int, gap = int)
+    # loopHistTweets(time_start = string, loops = int, gap = int, workers = int, priority = int)
     # loops optional, defaulted to 24, number of iterations, default set to 100 tweets per hour for 24 hours
     # gap optional, defaulted to 60, minutes between time_start iterations
+    # workers optional, defaulted to 1, number of windows requested concurrently (capped by max_workers and
+    # the X-RateLimit-Remaining budget), results are always returned in window order
+    # priority optional, defaulted to 0, scheduler priority of the windows (lower values run first)
     # time_start follows ISO 8601 time format (YYYY-MM-DDThh:mm:ss)
-    def loopHistTweets(self, time_start, loops=24, gap=60):
-        list_hist_tweet_objects = []
+    def loopHistTweets(self, time_start, loops=24, gap=60, workers=1, priority=0):
+        return list(self.iterHistTweets(time_start, loops, gap, workers, priority))
+    
+    # External function that yields the windows of loopHistTweets one at a time in window order
+    # only workers windows are fetched ahead, so memory does not grow with the number of loops
+    # iterHistTweets(time_start = string, loops = int, gap = int, workers = int, priority = int, skip_until = string)
+    # skip_until optional, defaulted to None, windows starting at or before this time are not requested
+    def iterHistTweets(self, time_start, loops=24, gap=60, workers=1, priority=0, skip_until=None):
+        windows = self._getWindows(time_start, loops, gap)
+        if skip_until is not None:
+            windows = [window for window in windows if window > skip_until]
         
-        for i in range(loops):
-            hist_tweet_object = {}
-            # convert string to datetime, add gap time, convert back to string
-            start_date = dateutil.parser.parse(time_start)
-            start_date += dateutil.relativedelta.relativedelta(minutes=gap*i)
-            time_start = start_date.strftime('%Y-%m-%dT%H:%M:%S')
-            
-            tweet_objects = self.getHistTweets(time_start)
+        while windows:
+            batch_size = self._concurrencyLimit(workers)
+            batch, windows = windows[:batch_size], windows[batch_size:]
+            tickets = [self.scheduler.submit(self.getHistTweets, (window,), priority) for window in batch]
+            results = self.scheduler.run(len(batch), tickets)
             
             # add results to dictionary with key as its time_start value
-            hist_tweet_object['time']= time_start
-            hist_tweet_object['tweets'] = tweet_objects
-            
-            list_hist_tweet_objects.append(hist_tweet_object)
-        return list_hist_tweet_objects
+            for window, ticket in zip(batch, tickets):
+                yield {'time': window, 'tweets': results.pop(ticket)}
+    
+    # External function that streams loopHistTweets windows to a newline delimited json file as they arrive
+    # each line holds one {'time', 'tweets'} window, re-running with the same arguments resumes after the
+    # last window written
+    # streamHistTweets(time_start = string, outfile_name = string, loops = int, gap = int, workers = int, 
+    #                  compress = bool) <--compress writes gzip, outfile_name should then end in .gz
+    # returns number of windows written during this call
+    def streamHistTweets(self, time_start, outfile_name, loops=24, gap=60, workers=1, compress=False):
+        outfile_path = 'data/coin_tweets/'+outfile_name
+        last_window = self._resumePoint(outfile_path)
+        
+        written = 0
+        for hist_tweet_object in self.iterHistTweets(time_start, loops, gap, workers, skip_until=last_window):
+            # reopen per window so an interrupted job loses at most the window being written
+            # (each gzip append is a separate, complete gzip member)
+            outfile = gzip.open(outfile_path, 'ab') if compress else open(outfile_path, 'a')
+            try:
+                outfile.write(json.dumps(hist_tweet_object) + '\n')
+            finally:
+                outfile.close()
+            written += 1
+        return written
+    
+    # Internal function returning time of last complete window in a streamed file (None if no file)
+    # a partially written trailing window is dropped so appending can continue from a clean file
+    # _resumePoint(outfile_path = string)
+    def _resumePoint(self, outfile_path):
+        if not os.path.exists(outfile_path):
+            return None
+        
+        last_window = None
+        complete = True
+        try:
+            for hist_tweet_object in self.iterSavedTweets(outfile_path):
+                last_window = hist_tweet_object['time']
+        except (IOError, EOFError, ValueError, zlib.error, struct.error):
+            complete = False
+        
+        if not complete:
+            # rewrite the readable windows, dropping the interrupted one
+            compressed = self._isGzip(outfile_path)
+            temp_path = outfile_path + '.tmp'
+            outfile = gzip.open(temp_path, 'wb') if compressed else open(temp_path, 'w')
+            try:
+                for hist_tweet_object in self._iterReadable(outfile_path):
+                    outfile.write(json.dumps(hist_tweet_object) + '\n')
+            finally:
+                outfile.close()
+            os.rename(temp_path, outfile_path)
+        elif not self._isGzip(outfile_path) and not self._endsWithNewline(outfile_path):
+            # write cut just before the trailing newline of a complete window, finished so the next window
+            # appended starts on its own line
+            with open(outfile_path, 'a') as outfile:
+                outfile.write('\n')
+        return last_window
+    
+    # Internal function that checks whether a file is empty or ends with a newline
+    # _endsWithNewline(infile_path = string)
+    def _endsWithNewline(self, infile_path):
+        with open(infile_path, 'rb') as infile:
+            infile.seek(0, os.SEEK_END)
+            if infile.tell() == 0:
+                return True
+            infile.seek(-1, os.SEEK_END)
+            return infile.read(1) == '\n'
+    
+    # Internal function yielding windows from a streamed file until the first unreadable one
+    # _iterReadable(infile_path = string)
+    def _iterReadable(self, infile_path):
+        try:
+            for hist_tweet_object in self.iterSavedTweets(infile_path):
+                yield hist_tweet_object
+        except (IOError, EOFError, ValueError, zlib.error, struct.error):
+            return
+    
+    # Internal function that builds the list of window start times used by loopHistTweets
+    # _getWindows(time_start = string, loops = int, gap = int)
+    def _getWindows(self, time_start, loops, gap):
+        start_date = dateutil.parser.parse(time_start)
+        windows = []
+        for i in range(loops):
+            # add gap time to original start, convert back to string
+            window = start_date + dateutil.relativedelta.relativedelta(minutes=gap*i)
+            windows.append(window.strftime('%Y-%m-%dT%H:%M:%S'))
+        return windows
+    
+    # Internal function that caps requested concurrency by max_workers and remaining request budget
+    # _concurrencyLimit(workers = int)
+    def _concurrencyLimit(self, workers):
+        try:
+            remaining = int(self.request_limits['X-RateLimit-Remaining'])
+        except (TypeError, ValueError):
+            remaining = workers
+        return max(1, min(workers, self.max_workers, remaining))
     
     # External function that returns historical tweets related to cryptocurrency markets
     # getHistTweets(time_start = string, time_end = string, limit = int)
@@ -101,12 +505,52 @@ class CoinAPI:
             url = self._url_stem+'/twitter/history?time_start='+time_start+'&limit='+str(limit)
         else:
             url = self._url_stem+'/twitter/history?time_start='+time_start+'&time_end='+time_end+'&limit='+str(limit)
-        response_object = requests.get(url, headers=self.headers)
-        
-        self._responseCheck(response_object)
-        self._updateRequestLimits(response_object)
         # returning only the tweet objects within REST API response object
-        return json.loads(response_object.text)
+        return self._cachedGet(url, {'endpoint': 'twitter', 'time_start': time_start, 'time_end': time_end, 'limit': limit})
+    
+    # Internal function that returns a cached response when available, otherwise requests and caches it
+    # _cachedGet(url = string, params = dict of endpoint, symbol, period, time range and limit identifying the request)
+    def _cachedGet(self, url, params):
+        if self.cache is None:
+            return self._get(url)
+        
+        # keyed on the endpoint base too, so responses of a stub server never stand in for coinAPI.io ones
+        key = self.cache.key(dict(params, url_stem=self._url_stem))
+        result = self.cache.get(key)
+        if result is None:
+            result = self._get(url)
+            if self._isHistorical(params['time_end'], params['limit'], result):
+                self.cache.put(key, result)
+        return result
+    
+    # Internal function that decides whether a response covers a closed historical window that is safe to cache
+    # a window with a time_end is closed once time_end has passed, without one the window is only closed if the
+    # response filled its limit (a short page means the request ran into the present)
+    # _isHistorical(time_end = string, limit = int, result = list of response objects)
+    def _isHistorical(self, time_end, limit, result):
+        if self.cache.cache_recent:
+            return True
+        if time_end is not None:
+            end_date = dateutil.parser.parse(time_end)
+            if end_date.tzinfo is None:
+                end_date = end_date.replace(tzinfo=dateutil.tz.tzutc())
+            return end_date < datetime.now(dateutil.tz.tzutc())
+        return len(result) >= limit
+    
+    # Internal function that executes a GET request on the pooled session through the request scheduler
+    # _get(url = string)
+    def _get(self, url):
+        return self.scheduler.request(url)
+    
+    # External function that returns request scheduler counters (requests, retries, cost, throttled_seconds, throughput)
+    def getRequestStats(self):
+        return self.scheduler.getStats()
+    
+    # External function that returns response cache counters (hits, misses, hit_rate, entries, bytes)
+    def getCacheStats(self):
+        if self.cache is None:
+            return {}
+        return self.cache.getStats()
     
     # External function that saves tweet text in a csv format
     # saveTweetsText(list_hist_tweet_objects = list of historical twitter objects, outfile_name = string, looped = bool)
@@ -114,19 +558,22 @@ class CoinAPI:
     # loopHistTweets function or single list of tweet objects from getHistTweets function
     def saveTweetsText(self, list_hist_tweet_objects, outfile_name, looped=True):
         outfile_path = 'data/coin_tweets/'+outfile_name
+        translator = self._getTranslator()
+        
+        # each request window is translated as one batch (grouped by language, cached and deduplicated)
+        if looped:
+            windows = (hist_tweet_object['tweets'] for hist_tweet_object in list_hist_tweet_objects)
+        else:
+            windows = [list_hist_tweet_objects]
         
         with open(outfile_path, 'w') as outfile:
-            if looped:
-                for hist_tweet_object in range(len(list_hist_tweet_objects)):
-                    for tweet in range(len(list_hist_tweet_objects[hist_tweet_object]['tweets'])):
-                        text = self._translate(list_hist_tweet_objects[hist_tweet_object]['tweets'][tweet]).encode('utf-8')
-                        outfile.write("".join(text.splitlines())+'\n')
-            else:
-                for tweet in range(len(list_hist_tweet_objects)):
-                    text = self._translate(list_hist_tweet_objects[tweet]).encode('utf-8')
-                    outfile.write("".join(text.splitlines()))
+            for tweet_objects in windows:
+                for text in translator.translateTweets(tweet_objects):
+                    text = text.encode('utf-8')
+                    outfile.write("".join(text.splitlines())+'\n')
             
             outfile.close()
+        translator.save()
     
     # External function that saves tweet objects in a json format 
     # saveTweets(list_of_tweet_objects = dict of twitter objects, outfile_name = string)
@@ -137,34 +584,56 @@ class CoinAPI:
             outfile.close()
     
     # External function that opens file in json format and saves as json object (reverse of saveTweets)
+    # also reads newline delimited (optionally gzip) files written by streamHistTweets
     # openSavedTweets(infile_path = string) <--data/coin_tweets/file_name if used saveTweets function
     def openSavedTweets(self, infile_path):
-        with open(infile_path) as json_file:
-            data = json.load(json_file)
+        return list(self.iterSavedTweets(infile_path))
+    
+    # External function that lazily yields saved tweet objects, one line at a time for files written by
+    # streamHistTweets (plain or gzip, detected from file contents) and one list item at a time for saveTweets files
+    # iterSavedTweets(infile_path = string)
+    def iterSavedTweets(self, infile_path):
+        json_file = gzip.open(infile_path, 'rb') if self._isGzip(infile_path) else open(infile_path)
+        try:
+            first_line = json_file.readline()
+            if first_line.lstrip().startswith('['):
+                # saveTweets format, single json list
+                for tweet_object in json.loads(first_line + json_file.read()):
+                    yield tweet_object
+                return
+            
+            for line in itertools.chain([first_line], json_file):
+                if line.strip():
+                    yield json.loads(line)
+        finally:
             json_file.close()
-        return data
+    
+    # Internal function that checks for the gzip magic number at the start of a file
+    # _isGzip(infile_path = string)
+    def _isGzip(self, infile_path):
+        with open(infile_path, 'rb') as infile:
+            return infile.read(2) == '\x1f\x8b'
         
     # Internal function that translate tweet into english using googletrans and language noted by twitter user
     # _translate(tweet_object = twitter object)
     def _translate(self, tweet_object):
-        try:
-            lang = tweet_object['user']['lang'][:2]
-            if lang != 'en':
-                text = self.translator.translate(tweet_object['text'], src=lang, dest='en').text
-            else:
-                text = tweet_object['text']
-        # exception handling for when 2 letter language code not recognized or no text value in twitter object
-        except:
-            if 'text' in tweet_object.keys():
-                print "unable to translate: ",tweet_object['text']
-                text = tweet_object['text']
-            else:
-                print "no text in tweet object"
-                text = ''
-            pass
-        return text
+        return self._getTranslator().translateTweets([tweet_object])[0]
+    
+    # Internal function that returns the batch translator, creating the default googletrans one on first use
+    def _getTranslator(self):
+        if self.translator is None:
+            self.translator = BatchTranslator()
+        return self.translator
+    
+    # External function that returns translation counters (cache_hits, duplicates, backend_texts, backend_calls,
+    # backend_requests)
+    def getTranslationStats(self):
+        if self.translator is None:
+            return {}
+        return dict(self.translator.stats)
     
     # Internal function that checks to ensure http request received a successful response (200)
+    # raises UnsuccessfulRequest so callers stop instead of continuing with an error response
     # _responseCheck(response_object = coinAPI response object)
     def _responseCheck(self, response_object):
         try:
@@ -174,11 +643,14 @@ class CoinAPI:
                 raise UnsuccessfulRequest(response_object.status_code)
         except UnsuccessfulRequest as e:
             print "Unsuccessful Request: Response Code {0}, {1}".format(e.status_code, e.status_response)
+            raise
     
     # Internal function that updates the request limits for that particular API Key
     # _updateRequestLimits(response_object = coinAPI response object)
     def _updateRequestLimits(self, response_object):
-        self.request_limits = {'X-RateLimit-Limit': response_object.headers['X-RateLimit-Limit'], 
-                               'X-RateLimit-Remaining': response_object.headers['X-RateLimit-Remaining'], 
-                               'X-RateLimit-Request-Cost' : response_object.headers['X-RateLimit-Request-Cost'], 
-                               'X-RateLimit-Reset' : response_object.headers['X-RateLimit-Reset']}
\ No newline at end of file
+        # headers missing from the response (e.g. error pages) keep their last known value
+        limits = dict(self.request_limits)
+        for header in limits.keys():
+            if header in response_object.headers:
+                limits[header] = response_object.headers[header]
+        self.request_limits = limits
\ No newline at end of file
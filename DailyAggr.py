@@ -1,76 +1,215 @@
 # Purpose of program is to compress multiple raw data csv files into a single csv
-# file for that day.  Raw files were generated through automatic queries using 
+# file for that day.  Raw files were generated through automatic queries using
 # tweepy and named under a standard naming convention (currency_YYYYMMDD-HHMMSS)
 # Files are taken and saved in a predetermined folder structure as mapped out in
 # www.github.com/JackNelson/Capstone
 import os
 import re
+import shutil
+from collections import OrderedDict
+from multiprocessing import Pool
+from Manifest import Manifest
+import pandas as pd
+import Storage
+
+# regex to get 8 digit day code in filename timestamp
+DAY_REGEX = re.compile("\d{8}")
+
+# tweepy timestamp columns parsed to datetimes when day files are stored in a columnar format
+DATE_COLUMNS = ['created_at', 'user_created_at']
 
 class DailyAggr:
-    
-    def __init__(self, folder_source, folder_dest):
+
+    # buffer_size optional, defaulted to 1MB, size of each block copied from dump files into day files
+    # fmt optional, defaulted to 'csv', day file format written by incremental aggregation ('csv', 'parquet', 'feather')
+    def __init__(self, folder_source, folder_dest, buffer_size=1024*1024, fmt='csv'):
         self.folder_source = folder_source
         self.folder_dest = folder_dest
-    
+        self.buffer_size = buffer_size
+        self.fmt = fmt
+
     # Internal function extracting list of csv files in folder
     def _getFiles(self):
         path = str(os.getcwd()) + "/" + self.folder_source
         files = []
-        # regex to get 8 digit day code in filename timestamp
-        reg = re.compile("\d{8}")
         for csv_path in os.listdir(path):
-            if reg.search(csv_path):
+            if DAY_REGEX.search(csv_path):
                 files.append(csv_path)
         return files
-    
+
     # Internal function creating list of unique day timestamps
     # _getDays(files = list of strings)
     def _getDays(self, files):
-        days = []
+        return list(self._groupDays(files).keys())
+
+    # Internal function bucketing files by their day timestamp in a single pass
+    # returns OrderedDict of day : list of files sorted by timestamp
+    # _groupDays(files = list of strings)
+    def _groupDays(self, files):
+        groups = OrderedDict()
         for csv_path in files:
-            # regex to get 8 digit day code in filename timestamp
-            day = re.search("\d{8}",csv_path).group(0)
-            if day not in days:
-                days.append(day)
-        return days
-    
+            day = DAY_REGEX.search(csv_path).group(0)
+            groups.setdefault(day, []).append(csv_path)
+        for day_files in groups.values():
+            day_files.sort()
+        return groups
+
     # Internal function appending csv files to single day csv
-    # _aggrDays(files = list of strings, days = list of strings)
-    def _aggrDays(self, files, days):
-        for day in days:
-            day_path = self.folder_dest + "/" + day + ".csv"
-            day_file = open(day_path, "a")
-            header = False
-            
-            for csv_path in files:
-                if day in csv_path:
-                    skip = 1
-                    csv_file = open(self.folder_source + "/" + csv_path)
-                    
-                    if (header == False):
-                        for line in csv_file:
-                            day_file.write(line)
-                            header = True
-                            
-                    else:
-                        for line in csv_file:
-                            if (skip == 0):
-                                day_file.write(line)
-                            else:
-                                skip = 0
-                    csv_file.close()
-            day_file.close()
+    # _aggrDays(files = list of strings, days = list of strings, workers = int)
+    # workers optional, defaulted to 1, number of processes aggregating days in parallel
+    def _aggrDays(self, files, days, workers=1):
+        groups = self._groupDays(files)
+        tasks = [(day, groups.get(day, [])) for day in days]
+
+        if workers > 1:
+            pool = Pool(workers)
+            try:
+                pool.map(_aggrDayWorker, [(self.folder_source, self.folder_dest, self.buffer_size, day, day_files)
+                                          for day, day_files in tasks])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for day, day_files in tasks:
+                self._aggrDay(day, day_files)
 
-# External function to execute DailyAggr class functions for a list of crypyocurrencies           
-def AggrDays(cryptos):
+    # Internal function aggregating only dump files not yet recorded in the folder_dest manifest
+    # days touched by new files are rewritten atomically, so reruns never duplicate rows
+    # _aggrNewDays(files = list of strings, workers = int), returns list of days written
+    def _aggrNewDays(self, files, workers=1):
+        manifest = self._getManifest()
+        tasks = self._planNewDays(files, manifest)
+        
+        if workers > 1 and len(tasks) > 1:
+            pool = Pool(workers)
+            try:
+                pool.map(_rewriteDayWorker, self._dayTasks(tasks))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for day, day_files, extend in tasks:
+                self._rewriteDay(day, day_files, extend)
+        
+        self._recordDays(tasks, manifest)
+        return [day for day, day_files, extend in tasks]
     
+    # Internal function returning manifest of dump files aggregated into folder_dest
+    def _getManifest(self):
+        return Manifest(self.folder_dest + "/.aggr_manifest.json")
+    
+    # Internal function returning (day, day_files, extend) for each day with new or changed dumps
+    # _planNewDays(files = list of strings, manifest = Manifest)
+    def _planNewDays(self, files, manifest):
+        tasks = []
+        for day, day_files in self._groupDays(files).items():
+            new_files = [csv_path for csv_path in day_files 
+                         if manifest.isChanged(csv_path, self.folder_source + "/" + csv_path)]
+            if not new_files:
+                continue
+            
+            day_path = Storage.withFormat(self.folder_dest + "/" + day + ".csv", self.fmt)
+            recorded = [csv_path for csv_path in day_files if csv_path in manifest]
+            if (self.fmt == 'csv' and os.path.exists(day_path) and os.path.getsize(day_path) > 0 and recorded 
+                and len(recorded) + len(new_files) == len(day_files)):
+                # previously aggregated dumps unchanged, extend existing day file with new dumps only
+                # (an empty day file, from empty dumps, has no header to extend so the day is rebuilt)
+                tasks.append((day, new_files, True))
+            else:
+                # first run, changed dump, columnar day or day file missing, rebuild day from all of its dumps
+                tasks.append((day, day_files, False))
+        return tasks
+    
+    # Internal function returning _rewriteDayWorker arguments for planned day tasks
+    # _dayTasks(tasks = list of tuples from _planNewDays)
+    def _dayTasks(self, tasks):
+        return [(self.folder_source, self.folder_dest, self.buffer_size, self.fmt) + task for task in tasks]
+    
+    # Internal function recording the dumps of written days in the manifest (only after the days are written)
+    # _recordDays(tasks = list of tuples from _planNewDays, manifest = Manifest)
+    def _recordDays(self, tasks, manifest):
+        for day, day_files, extend in tasks:
+            for csv_path in day_files:
+                manifest.record(csv_path, self.folder_source + "/" + csv_path)
+        manifest.save()
+    
+    # Internal function writing day csv to a temporary file and renaming it over the day csv
+    # _rewriteDay(day = string, day_files = list of strings, extend = bool)
+    # extend: start from the existing day csv and add day_files without their headers
+    def _rewriteDay(self, day, day_files, extend=False):
+        day_path = self.folder_dest + "/" + day + ".csv"
+        temp_path = day_path + ".tmp"
+        if extend:
+            shutil.copyfile(day_path, temp_path)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+        self._aggrDay(day, day_files, temp_path, header=extend)
+        
+        if self.fmt == 'csv':
+            os.rename(temp_path, day_path)
+        else:
+            self._convertDay(temp_path, Storage.withFormat(day_path, self.fmt))
+    
+    # Internal function converting an aggregated day csv into a typed columnar day file
+    # _convertDay(csv_path = string, day_path = string)
+    def _convertDay(self, csv_path, day_path):
+        df = pd.read_csv(csv_path, lineterminator='\n')
+        for column in DATE_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column], errors='coerce')
+        
+        temp_path = day_path + ".tmp" + os.path.splitext(day_path)[1]
+        Storage.writeFrame(df, temp_path)
+        os.rename(temp_path, day_path)
+        os.remove(csv_path)
+    
+    # Internal function appending one day's csv files to its day csv, header kept from first file only
+    # _aggrDay(day = string, day_files = list of strings, day_path = string, header = bool)
+    # day_path optional, defaulted to day csv in folder_dest
+    # header optional, defaulted to False, True when the destination already starts with a header
+    def _aggrDay(self, day, day_files, day_path=None, header=False):
+        if day_path is None:
+            day_path = self.folder_dest + "/" + day + ".csv"
+        with open(day_path, "ab") as day_file:
+            for csv_path in day_files:
+                with open(self.folder_source + "/" + csv_path, "rb") as csv_file:
+                    line = csv_file.readline()
+                    # keep header line from first non-empty file only
+                    if not header:
+                        day_file.write(line)
+                        header = bool(line)
+                    shutil.copyfileobj(csv_file, day_file, self.buffer_size)
+
+# Internal function used by multiprocessing pool to aggregate a single day
+# _aggrDayWorker(args = tuple of folder_source, folder_dest, buffer_size, day, day_files)
+def _aggrDayWorker(args):
+    folder_source, folder_dest, buffer_size, day, day_files = args
+    DailyAggr(folder_source, folder_dest, buffer_size)._aggrDay(day, day_files)
+
+# Internal function used by multiprocessing pool to rewrite a single day
+# _rewriteDayWorker(args = tuple of folder_source, folder_dest, buffer_size, fmt, day, day_files, extend)
+def _rewriteDayWorker(args):
+    folder_source, folder_dest, buffer_size, fmt, day, day_files, extend = args
+    DailyAggr(folder_source, folder_dest, buffer_size, fmt)._rewriteDay(day, day_files, extend)
+
+# External function to execute DailyAggr class functions for a list of crypyocurrencies
+# AggrDays(cryptos = list of strings, workers = int, incremental = bool, fmt = string)
+# incremental optional, defaulted to True, only aggregate dumps not already recorded in the day folder's
+# manifest (False appends every dump to its day csv as originally done)
+# fmt optional, defaulted to 'csv', day file format for incremental aggregation ('csv', 'parquet', 'feather')
+def AggrDays(cryptos, workers=1, incremental=True, fmt='csv'):
+
     for currency in cryptos:
         folder_source = "data/csv_dumps/"+currency
         folder_dest = "data/csv_daily/"+currency
-        obj = DailyAggr(folder_source, folder_dest)
+        obj = DailyAggr(folder_source, folder_dest, fmt=fmt)
         files = obj._getFiles()
-        days = obj._getDays(files)
-        obj._aggrDays(files, days)
-            
-cryptos = ['Bitcoin', 'ETH', 'Ripple']
-AggrDays(cryptos)
\ No newline at end of file
+        if incremental:
+            obj._aggrNewDays(files, workers)
+        else:
+            days = obj._getDays(files)
+            obj._aggrDays(files, days, workers)
+
+if __name__ == '__main__':
+    cryptos = ['Bitcoin', 'ETH', 'Ripple']
+    AggrDays(cryptos)
@@ -0,0 +1,193 @@
+# Purpose of program is to keep a table of daily sentiment aggregates for each cryptocurrency and
+# tweet folder, so charts and comparisons read one small row per day instead of every tweet score.
+# Rows are computed from the VADER score files written by Sentiment_VADER, and only days whose score
+# file is new or changed since the last update are recomputed.  Tables are saved in a predetermined
+# folder structure (data/daily/<folder>/<crypto>) as mapped out in www.github.com/JackNelson/Capstone
+import os
+import re
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+import numpy as np
+import pandas as pd
+import Storage
+from DataAggr import _readScores
+from Manifest import Manifest
+from Sentiment_VADER import SCORE_DECIMALS
+
+# regex to get 8 digit day code in score file names
+DAY_REGEX = re.compile("\d{8}")
+
+# quantiles of objective polarity magnitude kept for each of pos and neg tweets
+QUANTILES = [0.25, 0.5, 0.75]
+
+# columns of the daily table, in order
+# tweets: scored tweets, objective: tweets with neu != 1, value: mean polarity of objective tweets (as getDailyCompare)
+# pos_count/neg_count: objective tweets by getPolarity variable, <variable>_q<n>: quantiles of their polarity magnitude
+DAILY_COLUMNS = (['date', 'tweets', 'objective', 'objective_share', 'compound_mean', 'neg_mean', 'neu_mean',
+                  'pos_mean', 'value', 'pos_count', 'neg_count'] +
+                 ['{0}_q{1}'.format(variable, int(q*100)) for variable in ['pos', 'neg'] for q in QUANTILES])
+
+class DailyStore:
+    # DailyStore(folder = string, crypto = string, fmt = string, workers = int)
+    # folder and crypto: levels of detail in predetermined folder structure of the VADER score files
+    # fmt optional, defaulted to 'csv', format the daily table is saved in ('csv', 'parquet', 'feather')
+    # workers optional, defaulted to 8, number of threads reading score files during an update
+    def __init__(self, folder, crypto, fmt='csv', workers=8):
+        self.folder = folder
+        self.crypto = crypto
+        self.fmt = fmt
+        self.workers = workers
+        self.source = 'data/VADER/' + folder + '/' + crypto
+        self.path = Storage.withFormat('data/daily/' + folder + '/' + crypto + '.csv', fmt)
+        # table kept in memory after the first load or update
+        self._table = None
+
+    # External function recomputing rows for new or changed score files and saving the table
+    # update(force = bool), returns list of days recomputed
+    # force optional, defaulted to False, recompute every day instead of only new or changed ones
+    def update(self, force=False):
+        manifest = Manifest(self.path + '.manifest.json')
+        if not os.path.exists(self.path):
+            force = True
+
+        files = Storage.listDayFiles(self.source) if os.path.isdir(self.source) else []
+        # days missing from the table are recomputed too (e.g. a score file removed then put back)
+        table_days = set() if force else set(self._load()['date'])
+        changed = [filename for filename in files
+                   if force or _fileDay(filename) not in table_days 
+                   or manifest.isChanged(filename, self.source + '/' + filename)]
+
+        rows = []
+        if changed:
+            # days parsed here rather than in the threads: the first strptime of a python 2 process is not thread safe
+            days = [_fileDay(filename) for filename in changed]
+            pool = ThreadPool(max(1, min(self.workers, len(changed))))
+            try:
+                rows = pool.map(lambda args: self._dayRow(*args), zip(changed, days))
+            finally:
+                pool.close()
+                pool.join()
+
+        new_days = [row['date'] for row in rows]
+        table = pd.DataFrame(rows, columns=DAILY_COLUMNS) if rows else _emptyTable()
+        if not force:
+            # rows of recomputed days replaced, rows of days whose score file is gone dropped
+            old_table = self._load()
+            days = [_fileDay(filename) for filename in files]
+            old_table = old_table[old_table['date'].isin(days) & ~old_table['date'].isin(new_days)]
+            if rows:
+                table = pd.concat([old_table, table], ignore_index=True)
+            else:
+                table = old_table
+        table = table.sort_values('date').reset_index(drop=True)
+        self._save(table)
+
+        for filename in changed:
+            manifest.record(filename, self.source + '/' + filename)
+        manifest.save()
+        return new_days
+
+    # External function returning the daily table, optionally limited to a date range and joined to price changes
+    # getDaily(start = string or datetime, end = string or datetime, df_price_diff = pd.DataFrame)
+    # start and end optional, defaulted to None (no bound), first and last day (inclusive, e.g. '20180101')
+    # df_price_diff optional, defaulted to None, output of DataAggr.getPriceDiff to join on date
+    def getDaily(self, start=None, end=None, df_price_diff=None):
+        table = self._load()
+        if start is not None:
+            table = table[table['date'] >= pd.Timestamp(start)]
+        if end is not None:
+            table = table[table['date'] <= pd.Timestamp(end)]
+        table = table.reset_index(drop=True)
+        if df_price_diff is not None:
+            table = table.join(df_price_diff.set_index('date'), on='date')
+        return table
+
+    # External function returning mean daily polarity of objective tweets joined to daily price changes,
+    # the same frame DataAggr.getDailyCompare builds from every tweet score
+    # getDailyCompare(df_price_diff = pd.DataFrame)
+    # df_price_diff optional, defaulted to None, output of DataAggr.getPriceDiff to join on date
+    def getDailyCompare(self, df_price_diff=None):
+        table = self._load()
+        df_daily = table.loc[table['objective'] > 0, ['date', 'value']].reset_index(drop=True)
+        if df_price_diff is not None:
+            df_daily = df_daily.join(df_price_diff.set_index('date'), on='date')
+        return df_daily
+
+    # Internal function computing the daily table row of a single score file
+    # _dayRow(filename = string, day = pd.Timestamp) <--day of the file, as returned by _fileDay
+    def _dayRow(self, filename, day):
+        df = _readScores(self.source + '/' + filename)
+        # float32 scores rounded back to the exact values VADER produced before aggregating
+        scores = dict((column, np.round(df[column].values.astype(np.float64), SCORE_DECIMALS))
+                      for column in ['compound', 'neg', 'neu', 'pos'])
+
+        # polarity of objective tweets, pos when pos > neg else -neg (as getPolarity)
+        objective = scores['neu'] != 1
+        pos = scores['pos'][objective]
+        neg = scores['neg'][objective]
+        is_pos = pos > neg
+        polarity = np.where(is_pos, pos, -neg)
+
+        row = {'date': day, 'tweets': len(df), 'objective': len(polarity),
+               'objective_share': float(len(polarity)) / len(df) if len(df) else np.nan,
+               # summed in order like the groupby mean in getDailyCompare, so both give identical values
+               'value': np.cumsum(polarity)[-1] / len(polarity) if len(polarity) else np.nan}
+        for column in ['compound', 'neg', 'neu', 'pos']:
+            row[column + '_mean'] = scores[column].mean() if len(df) else np.nan
+        for variable, magnitudes in [('pos', pos[is_pos]), ('neg', neg[~is_pos])]:
+            row[variable + '_count'] = len(magnitudes)
+            # linear interpolation between values, as pd.Series.quantile
+            quantiles = [np.nan]*len(QUANTILES)
+            if len(magnitudes):
+                quantiles = np.percentile(magnitudes, [q*100 for q in QUANTILES])
+            for q, quantile in zip(QUANTILES, quantiles):
+                row['{0}_q{1}'.format(variable, int(q*100))] = quantile
+        return row
+
+    # Internal function returning the saved table (empty when never updated), read from disk once
+    def _load(self):
+        if self._table is None:
+            if os.path.exists(self.path):
+                # round_trip so csv values read back exactly as they were computed
+                self._table = Storage.readFrame(self.path, parse_dates=['date'], float_precision='round_trip')
+            else:
+                self._table = _emptyTable()
+        return self._table
+
+    # Internal function writing table to a temporary file and renaming it over the saved table
+    # _save(table = pd.DataFrame)
+    def _save(self, table):
+        folder = os.path.dirname(self.path)
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # created by another process
+                pass
+        temp_path = self.path + '.tmp' + os.path.splitext(self.path)[1]
+        Storage.writeFrame(table, temp_path)
+        os.rename(temp_path, self.path)
+        self._table = table
+
+# Internal function returning the day of a score file as a timestamp
+# _fileDay(filename = string)
+def _fileDay(filename):
+    return pd.Timestamp(datetime.strptime(DAY_REGEX.search(filename).group(0), '%Y%m%d'))
+
+# Internal function returning a daily table without rows
+def _emptyTable():
+    table = pd.DataFrame({column: np.array([], dtype=np.float64) for column in DAILY_COLUMNS}, columns=DAILY_COLUMNS)
+    table['date'] = pd.Series([], dtype='datetime64[ns]')
+    return table
+
+# External function to update daily tables for a list of cryptocurrencies and tweet folders
+# UpdateDaily(cryptos = list of strings, folders = list of strings, fmt = string)
+# folders optional, defaulted to ['csv_daily'], tweet folders whose score files are aggregated
+def UpdateDaily(cryptos, folders=['csv_daily'], fmt='csv'):
+    for folder in folders:
+        for crypto in cryptos:
+            DailyStore(folder, crypto, fmt).update()
+
+if __name__ == '__main__':
+    cryptos = ['Bitcoin', 'ETH', 'Ripple']
+    UpdateDaily(cryptos)
@@ -3,51 +3,78 @@
 # used to consolidate script in jupyter notebook used for analysis.
 # Files are taken from a predetermined folder structure as mapped out in
 # www.github.com/JackNelson/Capstone
+import hashlib
+import numpy as np
 import pandas as pd
 import os
 import re
+import scipy.stats as stats
 from datetime import datetime
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import Storage
+
+# score columns of VADER result files and the type they are read as
+SCORE_DTYPES = OrderedDict([('compound', np.float32), ('neg', np.float32), ('neu', np.float32), ('pos', np.float32)])
+
+# beta fits of recent datasets keyed on a hash of their values and fit settings, oldest used evicted first
+_betaFits = OrderedDict()
+BETA_CACHE_SIZE = 64
 
 # External function to return a dataframe of VADER polarity scores from multiple VADER result csv files
-# fetchSentiments(folder = string, crypto = string)
+# fetchSentiments(folder = string, crypto = string, start = string or datetime, end = string or datetime, workers = int)
 # folder and crypto: levels of detail in predetermined folder structure used to path to pull files
-def fetchSentiments(folder, crypto):
+# start and end optional, defaulted to None (no bound), first and last day (inclusive, e.g. '20180101') to read,
+# days outside the range are skipped by file name without being opened
+# workers optional, defaulted to 8, number of threads reading day files
+# scores are returned as float32 columns with a datetime date column for the day of each file
+def fetchSentiments(folder, crypto, start=None, end=None, workers=8):
     reg = re.compile('\d{8}')
     path = 'data/VADER/' + folder + '/' + crypto + '/'
-    #create list of .txt files in folder path that match regular expression
-    files = [reg.search(filename).group(0) for filename in os.listdir(path) if reg.search(filename)]
+    #create list of score files in folder path (csv/txt, parquet or feather, one per day)
+    files = Storage.listDayFiles(path)
+    days = [pd.Timestamp(datetime.strptime(reg.search(filename).group(0), '%Y%m%d')) for filename in files]
     
-    #determine correct file format suffix based on folder
-    if folder == 'coin_tweets':
-        suffix = '.txt'
-    else:
-        suffix = '.csv'
+    if start is not None or end is not None:
+        start = pd.Timestamp(start) if start is not None else pd.Timestamp.min
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp.max
+        in_range = [(filename, day) for filename, day in zip(files, days) if start <= day <= end]
+        files = [filename for filename, day in in_range]
+        days = [day for filename, day in in_range]
+    
+    if not files:
+        df = pd.DataFrame({column: np.array([], dtype=np.float32) for column in SCORE_DTYPES}, 
+                          columns=list(SCORE_DTYPES))
+        df['date'] = pd.Series([], dtype='datetime64[ns]')
+        return df
     
-    #initialize and append dataframes made from each .txt file
-    for filename in files:
-        df_exists = 'df' in locals()
-        if not df_exists:
-            df = pd.read_csv(path+filename+suffix)
-            df['date'] = datetime.strptime(filename, '%Y%m%d')
-        else:
-            temp = pd.read_csv(path+filename+suffix)
-            temp['date'] = datetime.strptime(filename, '%Y%m%d')
-            df = pd.concat([df, temp])                
+    #read score files concurrently (reading and parsing release the GIL) then concatenate once
+    pool = ThreadPool(max(1, min(workers, len(files))))
+    try:
+        frames = pool.map(lambda filename: _readScores(path + filename), files)
+    finally:
+        pool.close()
+        pool.join()
+    
+    df = pd.concat(frames)
+    df['date'] = np.repeat(np.array(days, dtype='datetime64[ns]'), [len(frame) for frame in frames])
     return df
 
+# Internal function reading a single VADER score file with float32 score columns
+# _readScores(path = string)
+def _readScores(path):
+    # dtype only applies to csv files, columnar files already carry their own types
+    df = Storage.readFrame(path, dtype=SCORE_DTYPES)
+    return df.astype(SCORE_DTYPES, copy=False)
+
 # External function to return a dataframe of the highest VADER polarity score between pos/neg in VADER score df
 # getPolarity(df = pd.DataFrame)   
 def getPolarity(df):
-    data = {'date':[], 'value':[], 'variable':[]}
-    for index, row in df.iterrows():
-        data['date'].append(row['date'])
-        if row['pos'] > row['neg']:
-            data['value'].append(row['pos'])
-            data['variable'].append('pos')
-        else:
-            data['value'].append(row['neg']*-1)
-            data['variable'].append('neg')
-    df_polarity = pd.DataFrame.from_dict(data)
+    is_pos = (df['pos'] > df['neg']).values
+    data = {'date': df['date'].values, 
+            'value': np.where(is_pos, df['pos'].values, df['neg'].values*-1).astype(np.float64), 
+            'variable': np.where(is_pos, 'pos', 'neg').astype(object)}
+    df_polarity = pd.DataFrame(data, columns=['date', 'value', 'variable'])
     
     return df_polarity
 
@@ -55,11 +82,186 @@ def getPolarity(df):
 # External function to return a dataframe of daily price changes from CoinAPI OCHLV csv file
 # getPriceDiff(df = pd.DataFrame)    
 def getPriceDiff(df):
-    data = {'date':[], 'price_diff':[]}
-    for index, row in df.iterrows():
-        data['date'].append(datetime.strptime(row['time_period_start'], '%Y-%m-%dT%H:%M:%S.%f0Z'))
-        data['price_diff'].append(row['price_close'] - row['price_open'])
-    df_price_diff = pd.DataFrame.from_dict(data)
+    data = {'date': _parseTimestamps(df['time_period_start']).values, 
+            'price_diff': (df['price_close'] - df['price_open']).values}
+    df_price_diff = pd.DataFrame(data, columns=['date', 'price_diff'])
     
     return df_price_diff
-        
\ No newline at end of file
+
+
+# Internal function parsing a column of CoinAPI timestamps (e.g. 2018-01-01T00:00:00.0000000Z) in one pass
+# _parseTimestamps(timestamps = pd.Series of strings)
+def _parseTimestamps(timestamps):
+    timestamps = timestamps.astype(str)
+    if timestamps.str.endswith('0Z').all():
+        # without the trailing '0Z' the format is plain ISO 8601, which pandas parses without strptime
+        return pd.to_datetime(timestamps.str[:-2], format='%Y-%m-%dT%H:%M:%S.%f')
+    # anything else goes through the full format, raising on timestamps it does not match
+    return pd.to_datetime(timestamps, format='%Y-%m-%dT%H:%M:%S.%f0Z')
+
+# External function to return a dataframe of mean daily polarity of objective tweets joined to daily price changes
+# getDailyCompare(df = pd.DataFrame, df_price_diff = pd.DataFrame)
+# df: VADER score df from fetchSentiments
+# df_price_diff optional, defaulted to None, output of getPriceDiff to join on date
+def getDailyCompare(df, df_price_diff=None):
+    df_polar = getPolarity(df[df.neu != 1])
+    df_daily = pd.DataFrame({'value':df_polar.groupby(['date'])['value'].mean()}).reset_index()
+    if df_price_diff is not None:
+        df_daily = df_daily.join(df_price_diff.set_index('date'), on='date')
+    return df_daily
+
+# External function to return per day, per polarity boxplot statistics of polarity magnitudes (as drawn by
+# dailySentimentsOverview) computed in one grouped pass, small enough to plot millions of tweets from
+# getOverviewStats(df = pd.DataFrame or iterable of pd.DataFrames, whis = float, outliers = int, resolution = int)
+# df: getPolarity output, or an iterable of getPolarity chunks which are reduced one at a time (streaming)
+# whis optional, defaulted to 1.5, whisker reach in interquartile ranges (as matplotlib/seaborn boxplots)
+# outliers optional, defaulted to 20, largest number of distinct outlier values kept per box (None keeps all)
+# resolution optional, defaulted to None (exact), magnitudes rounded to 1/resolution before counting so each
+# box needs at most resolution+1 counts (VADER scores have 3 decimals, so 1000 is still exact for them)
+# returns dataframe of date, variable, count, q1, med, q3, whislo, whishi, fliers (list of outlier values)
+def getOverviewStats(df, whis=1.5, outliers=20, resolution=None):
+    if isinstance(df, pd.DataFrame):
+        counts = _magnitudeCounts(df, resolution)
+    else:
+        # each chunk reduced to counts of its distinct magnitudes as it arrives, merged once at the end
+        chunk_counts = [_magnitudeCounts(chunk, resolution) for chunk in df]
+        if not chunk_counts:
+            chunk_counts = [_magnitudeCounts(pd.DataFrame({'date': [], 'value': [], 'variable': []}))]
+        counts = pd.concat(chunk_counts).groupby(level=[0, 1, 2]).sum()
+
+    dates = counts.index.get_level_values(0)
+    variables = counts.index.get_level_values(1)
+    magnitudes = counts.index.get_level_values(2).values
+    # boxes are runs of the (date, variable) sorted index
+    starts = np.flatnonzero(np.r_[True, (dates[1:] != dates[:-1]) | (variables[1:] != variables[:-1])])
+    if not len(counts):
+        starts = starts[:0]
+    ends = np.r_[starts[1:], len(counts)]
+
+    rows = []
+    for start, end in zip(starts, ends):
+        stats = _boxStats(magnitudes[start:end], counts.values[start:end], whis, outliers)
+        rows.append([dates[start], variables[start]] + stats)
+    return pd.DataFrame(rows, columns=['date', 'variable', 'count', 'q1', 'med', 'q3', 'whislo', 'whishi', 'fliers'])
+
+# Internal function returning number of tweets at each polarity magnitude, indexed by date, variable, magnitude
+# _magnitudeCounts(df = pd.DataFrame, resolution = int)
+def _magnitudeCounts(df, resolution=None):
+    magnitudes = np.abs(df['value'].values.astype(np.float64))
+    if resolution is not None:
+        magnitudes = np.rint(magnitudes*resolution) / resolution
+    keys = pd.DataFrame({'date': df['date'].values, 'variable': df['variable'].values, 'magnitude': magnitudes})
+    return keys.groupby(['date', 'variable', 'magnitude']).size()
+
+# Internal function returning count, quartiles, whiskers and outliers of a box from its distinct values
+# (ascending) and their counts, matching matplotlib's boxplot statistics for the expanded values
+# _boxStats(values = np.array, counts = np.array, whis = float, outliers = int)
+def _boxStats(values, counts, whis, outliers):
+    cumulative = np.cumsum(counts)
+    n = cumulative[-1]
+
+    # linearly interpolated quantile (as np.percentile) read off the cumulative counts
+    def quantile(q):
+        position = q*(n - 1)
+        k = int(np.floor(position))
+        low = values[np.searchsorted(cumulative, k, side='right')]
+        high = values[np.searchsorted(cumulative, min(k + 1, n - 1), side='right')]
+        return low + (high - low)*(position - k)
+    q1, med, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+
+    # whiskers reach the most extreme values within whis interquartile ranges of the box
+    iqr = q3 - q1
+    whishi = values[np.searchsorted(values, q3 + whis*iqr, side='right') - 1]
+    whislo = values[np.searchsorted(values, q1 - whis*iqr, side='left')]
+    whishi = max(whishi, q3)
+    whislo = min(whislo, q1)
+
+    fliers = values[(values < whislo) | (values > whishi)]
+    if outliers is not None and len(fliers) > outliers:
+        # evenly spaced through the sorted outliers, so the most extreme ones are always kept
+        fliers = fliers[np.linspace(0, len(fliers) - 1, outliers).astype(int)] if outliers else fliers[:0]
+    return [int(n), q1, med, q3, whislo, whishi, fliers.tolist()]
+
+# External function to return per day shares of objective (neu != 1) and neutral (neu == 1) tweets
+# getObjectiveRate(df = pd.DataFrame or iterable of pd.DataFrames)
+# df: VADER score df from fetchSentiments, daily table from DailyStore.getDaily (tweets and objective counts
+# already kept per day, so no tweet is read), or an iterable of either which is reduced one piece at a time
+# days are grouped on their date values (datetime or integer codes), never converted to strings
+# returns dataframe of date, tweets, objective_share, neutral_share sorted by date
+def getObjectiveRate(df):
+    if isinstance(df, pd.DataFrame):
+        counts = _objectiveCounts(df)
+    else:
+        # each piece reduced to per day counts as it arrives, days split across pieces summed once at the end
+        piece_counts = [_objectiveCounts(piece) for piece in df]
+        if not piece_counts:
+            piece_counts = [_objectiveCounts(pd.DataFrame({'date': [], 'neu': []}))]
+        counts = pd.concat(piece_counts).groupby(level=0).sum()
+
+    counts = counts.sort_index()
+    tweets = counts['tweets'].values
+    with np.errstate(invalid='ignore', divide='ignore'):
+        objective_share = counts['objective'].values / tweets.astype(np.float64)
+    return pd.DataFrame({'date': counts.index.values, 'tweets': tweets, 'objective_share': objective_share,
+                         'neutral_share': 1 - objective_share},
+                        columns=['date', 'tweets', 'objective_share', 'neutral_share'])
+
+# Internal function returning number of tweets and objective tweets indexed by date
+# _objectiveCounts(df = pd.DataFrame) <--VADER score df or DailyStore daily table
+def _objectiveCounts(df):
+    if 'objective' in df.columns and 'tweets' in df.columns:
+        counts = df[['tweets', 'objective']].astype(np.int64)
+        counts.index = df['date'].values
+        return counts.groupby(level=0).sum()
+    # integer codes for each distinct day, counted with bincount (days without a date, code -1, are dropped)
+    codes, days = pd.factorize(df['date'])
+    known = codes >= 0
+    codes = codes[known]
+    objective = (df['neu'].values != 1)[known]
+    return pd.DataFrame({'tweets': np.bincount(codes, minlength=len(days)),
+                         'objective': np.bincount(codes, weights=objective, minlength=len(days)).astype(np.int64)},
+                        index=days, columns=['tweets', 'objective'])
+
+# External function to return a beta distribution fitted to values in [0, 1] and its density on a fixed grid
+# (the grid is the same for every fit, so curves of different series line up point for point)
+# getBetaFit(values = pd.Series or np.array, method = string, points = int, sample = int)
+# method optional, defaulted to 'moments', 'moments' solves for a and b from the mean and variance on [0, 1],
+# 'mle' runs scipy's maximum likelihood fit (with loc and scale, as sns.distplot(fit=stats.beta)) on a sample
+# points optional, defaulted to 200, number of evenly spaced grid points (cell centers of [0, 1])
+# sample optional, defaulted to 10000, largest number of values the 'mle' fit is run on (None uses all)
+# fits are cached per dataset, so refitting unchanged values (e.g. redrawing a chart) costs one hash
+# returns dictionary of a, b, loc, scale, n (values fitted) and curve (dataframe of x, density)
+def getBetaFit(values, method='moments', points=200, sample=10000):
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    sha1 = hashlib.sha1(values.tobytes())
+    sha1.update(repr((method, points, sample)).encode('utf-8'))
+    key = sha1.hexdigest()
+    if key in _betaFits:
+        _betaFits[key] = _betaFits.pop(key)
+        return _betaFits[key]
+
+    values = values[~np.isnan(values)]
+    a, b, loc, scale = np.nan, np.nan, 0.0, 1.0
+    if method == 'mle':
+        if sample is not None and len(values) > sample:
+            # fixed seed so the same dataset always gives the same fit
+            values = np.random.RandomState(0).choice(values, sample, replace=False)
+        if len(values) > 1:
+            a, b, loc, scale = stats.beta.fit(values)
+    elif method == 'moments':
+        mean, variance = (values.mean(), values.var()) if len(values) else (np.nan, np.nan)
+        if variance > 0:
+            common = mean*(1 - mean) / variance - 1
+            a, b = mean*common, (1 - mean)*common
+    else:
+        raise ValueError("Unsupported beta fit method: " + method)
+
+    x = (np.arange(points) + 0.5) / points
+    density = stats.beta.pdf(x, a, b, loc, scale) if a > 0 and b > 0 else np.full(points, np.nan)
+    fit = {'a': a, 'b': b, 'loc': loc, 'scale': scale, 'n': len(values),
+           'curve': pd.DataFrame({'x': x, 'density': density}, columns=['x', 'density'])}
+
+    _betaFits[key] = fit
+    while len(_betaFits) > BETA_CACHE_SIZE:
+        _betaFits.popitem(last=False)
+    return fit
@@ -0,0 +1,175 @@
+# Purpose of program is to measure whether daily sentiment leads daily price changes.  Functions take
+# the daily frames built from getPolarity/getPriceDiff output (DataAggr.getDailyCompare with prices, or
+# DailyStore.getDaily joined to getPriceDiff) and compute rolling correlations, lagged cross correlations
+# and Granger-style F tests.  Each function covers a whole set of windows or lags in one pass over numpy
+# arrays, and sweepLeadLag runs them for many symbols at once across a process pool.
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+# External function to return rolling correlations between two daily series for several window lengths
+# getRollingCorr(df = pd.DataFrame, windows = list of ints, x = string, y = string, min_periods = int)
+# df: daily frame with date column and x, y columns (e.g. getDailyCompare joined to getPriceDiff)
+# windows optional, defaulted to [7, 14, 30], window lengths in days
+# x and y optional, defaulted to 'value' (mean daily polarity) and 'price_diff'
+# min_periods optional, defaulted to None (each window's length), days with both values a window needs
+# returns long dataframe of date, window, corr
+def getRollingCorr(df, windows=[7, 14, 30], x='value', y='price_diff', min_periods=None):
+    daily = _dailySeries(df, [x, y])
+    windows = np.asarray(windows)
+    # days where only one series is known count for neither (as pd.Series.rolling(...).corr)
+    known = ~np.isnan(daily[x].values) & ~np.isnan(daily[y].values)
+    xs = _centered(daily[x].values, known)
+    ys = _centered(daily[y].values, known)
+
+    # window sums for every day and window at once (rows are days, columns windows)
+    ends = np.arange(1, len(xs) + 1)[:, None]
+    starts = np.maximum(ends - windows[None, :], 0)
+    n = _windowSums(known.astype(np.float64), starts, ends)
+    sx, sy = _windowSums(xs, starts, ends), _windowSums(ys, starts, ends)
+    sxy, sxx, syy = [_windowSums(values, starts, ends) for values in [xs*ys, xs*xs, ys*ys]]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = (n*sxy - sx*sy) / np.sqrt((n*sxx - sx*sx) * (n*syy - sy*sy))
+    # windows with fewer than min_periods known days (default the window length) have no correlation
+    required = windows if min_periods is None else np.full(len(windows), min_periods)
+    corr[n < required[None, :]] = np.nan
+
+    return pd.DataFrame({'date': np.tile(daily.index.values, len(windows)),
+                         'window': np.repeat(windows, len(xs)),
+                         'corr': corr.T.ravel()}, columns=['date', 'window', 'corr'])
+
+# External function to return correlation of x with y shifted by each lag
+# positive lags pair x on a day with y lag days later, so a peak at a positive lag means x leads y
+# getCrossCorr(df = pd.DataFrame, lags = list of ints, x = string, y = string)
+# lags optional, defaulted to -10 through 10 days
+# returns dataframe of lag, corr, n (number of days with both values)
+def getCrossCorr(df, lags=range(-10, 11), x='value', y='price_diff'):
+    daily = _dailySeries(df, [x, y])
+    lags = np.asarray(lags)
+    # every lag at once: column j holds y shifted back by lags[j]
+    shifted = _lagMatrix(daily[y].values, lags)
+    corr, n = _columnCorr(daily[x].values, shifted)
+    return pd.DataFrame({'lag': lags, 'corr': corr, 'n': n}, columns=['lag', 'corr', 'n'])
+
+# External function to return Granger-style F tests of whether past values of cause improve a linear
+# autoregression of effect, for each number of lags up to max_lag
+# getGranger(df = pd.DataFrame, max_lag = int, cause = string, effect = string)
+# max_lag optional, defaulted to 5, largest number of past days in both models
+# cause and effect optional, defaulted to 'value' (mean daily polarity) and 'price_diff'
+# returns dataframe of lag, f_stat, p_value, n (days used in the regressions)
+def getGranger(df, max_lag=5, cause='value', effect='price_diff'):
+    daily = _dailySeries(df, [cause, effect])
+    lags = -np.arange(1, max_lag + 1)
+    past_effect = _lagMatrix(daily[effect].values, lags)
+    past_cause = _lagMatrix(daily[cause].values, lags)
+    target = daily[effect].values
+
+    results = []
+    for p in range(1, max_lag + 1):
+        restricted = past_effect[:, :p]
+        unrestricted = np.hstack([restricted, past_cause[:, :p]])
+        # only days where the target and every lag of both series are known
+        rows = ~np.isnan(target) & ~np.isnan(unrestricted).any(axis=1)
+        n = int(rows.sum())
+        dof = n - 2*p - 1
+        if dof <= 0:
+            results.append((p, np.nan, np.nan, n))
+            continue
+        rss_restricted = _rss(restricted[rows], target[rows])
+        rss_unrestricted = _rss(unrestricted[rows], target[rows])
+        f_stat = ((rss_restricted - rss_unrestricted) / p) / (rss_unrestricted / dof)
+        results.append((p, f_stat, stats.f.sf(f_stat, p, dof), n))
+    return pd.DataFrame(results, columns=['lag', 'f_stat', 'p_value', 'n'])
+
+# External function running rolling correlation, cross correlation and Granger tests for many symbols
+# sweepLeadLag(frames = dict, windows = list of ints, lags = list of ints, max_lag = int, workers = int)
+# frames: dict of symbol : daily frame as taken by the functions above
+# workers optional, defaulted to 1, number of processes symbols are spread across (1 runs in this process)
+# returns dictionary of 'rolling', 'cross', 'granger' : long dataframe with a symbol column
+def sweepLeadLag(frames, windows=[7, 14, 30], lags=range(-10, 11), max_lag=5, workers=1, x='value',
+                 y='price_diff'):
+    tasks = [(symbol, df, list(windows), list(lags), max_lag, x, y) for symbol, df in sorted(frames.items())]
+    if workers > 1 and len(tasks) > 1:
+        pool = Pool(min(workers, len(tasks)))
+        try:
+            results = pool.map(_sweepWorker, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_sweepWorker(task) for task in tasks]
+
+    sweep = {}
+    for name in ['rolling', 'cross', 'granger']:
+        pieces = [result[name] for result in results]
+        sweep[name] = pd.concat(pieces, ignore_index=True) if pieces else pd.DataFrame()
+    return sweep
+
+# Internal function used by multiprocessing pool to run every analysis for a single symbol
+# _sweepWorker(args = tuple of symbol, df, windows, lags, max_lag, x, y)
+def _sweepWorker(args):
+    symbol, df, windows, lags, max_lag, x, y = args
+    result = {'rolling': getRollingCorr(df, windows, x, y),
+              'cross': getCrossCorr(df, lags, x, y),
+              'granger': getGranger(df, max_lag, x, y)}
+    for frame in result.values():
+        frame.insert(0, 'symbol', symbol)
+    return result
+
+# Internal function returning columns of a daily frame indexed by every calendar day between its first and
+# last date, so lags and windows count days even when some days are missing (missing days are NaN)
+# _dailySeries(df = pd.DataFrame, columns = list of strings)
+def _dailySeries(df, columns):
+    daily = df.groupby(pd.to_datetime(df['date']))[columns].mean().astype(np.float64)
+    if len(daily):
+        daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq='D'))
+    return daily
+
+# Internal function returning values minus their mean over known days, 0 on other days, so running sums
+# stay small relative to the window sums taken from them
+# _centered(values = np.array, known = np.array of bools)
+def _centered(values, known):
+    if not known.any():
+        return np.zeros(len(values))
+    return np.where(known, values - values[known].mean(), 0.0)
+
+# Internal function returning sum of values over each window from starts (exclusive) to ends (inclusive),
+# taken as differences of one running sum
+# _windowSums(values = np.array, starts = np.array, ends = np.array)
+def _windowSums(values, starts, ends):
+    running = np.concatenate([[0.0], np.cumsum(values)])
+    return running[ends] - running[starts]
+
+# Internal function returning matrix whose column j is values shifted so row t holds values[t + lags[j]]
+# (NaN where t + lags[j] falls outside the series)
+# _lagMatrix(values = np.array, lags = np.array)
+def _lagMatrix(values, lags):
+    index = np.arange(len(values))[:, None] + np.asarray(lags)[None, :]
+    inside = (index >= 0) & (index < len(values))
+    matrix = np.full(index.shape, np.nan)
+    matrix[inside] = values[index[inside]]
+    return matrix
+
+# Internal function returning pearson correlation of x with each column of matrix over the rows where both
+# are known, along with the number of those rows (correlation is NaN with fewer than 3 rows)
+# _columnCorr(x = np.array, matrix = np.array)
+def _columnCorr(x, matrix):
+    known = ~np.isnan(matrix) & ~np.isnan(x)[:, None]
+    n = known.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xs = np.where(known, x[:, None], 0.0)
+        ys = np.where(known, matrix, 0.0)
+        dx = np.where(known, xs - xs.sum(axis=0) / n, 0.0)
+        dy = np.where(known, ys - ys.sum(axis=0) / n, 0.0)
+        corr = (dx*dy).sum(axis=0) / np.sqrt((dx**2).sum(axis=0) * (dy**2).sum(axis=0))
+    corr[n < 3] = np.nan
+    return corr, n
+
+# Internal function returning residual sum of squares of a least squares fit of y on columns plus intercept
+# _rss(columns = np.array, y = np.array)
+def _rss(columns, y):
+    design = np.hstack([np.ones((len(y), 1)), columns])
+    coefficients = np.linalg.lstsq(design, y, rcond=None)[0]
+    residuals = y - design.dot(coefficients)
+    return residuals.dot(residuals)
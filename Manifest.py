@@ -0,0 +1,75 @@
+# Purpose of program is to keep track of which input files have already been processed by
+# a pipeline step.  Each file is recorded under a name with a fingerprint of its size and
+# modification time (optionally a content hash), so reruns can skip files that have not
+# changed since they were last processed.  Manifests are saved as json next to the output
+# they describe.
+import hashlib
+import json
+import os
+
+class Manifest:
+    # Manifest(path = string, use_hash = bool) <--json file the manifest is loaded from and saved to
+    # use_hash optional, defaulted to False, also record a sha1 of file contents so files whose size or
+    # modification time changed but whose contents did not (e.g. copied or touched) are not reprocessed
+    def __init__(self, path, use_hash=False):
+        self.path = path
+        self.use_hash = use_hash
+        self.entries = {}
+        # set when entries change, so saving an unchanged manifest writes nothing
+        self._changed = False
+        if os.path.exists(self.path):
+            with open(self.path) as infile:
+                self.entries = json.load(infile)
+
+    # External function returning fingerprint of a file on disk
+    # fingerprint(file_path = string)
+    def fingerprint(self, file_path):
+        stat = os.stat(file_path)
+        if self.use_hash:
+            return [stat.st_size, stat.st_mtime, self._hash(file_path)]
+        return [stat.st_size, stat.st_mtime]
+
+    # External function checking if a file is new or has changed since it was recorded
+    # isChanged(name = string, file_path = string)
+    def isChanged(self, name, file_path):
+        entry = self.entries.get(name)
+        if entry is None:
+            return True
+        stat = os.stat(file_path)
+        if entry[:2] == [stat.st_size, stat.st_mtime]:
+            return False
+        # size or mtime differ, contents may still match when a hash was recorded
+        if self.use_hash and len(entry) > 2 and entry[2] == self._hash(file_path):
+            self.entries[name] = [stat.st_size, stat.st_mtime, entry[2]]
+            self._changed = True
+            return False
+        return True
+
+    # External function recording current fingerprint of a file
+    # record(name = string, file_path = string)
+    def record(self, name, file_path):
+        self.entries[name] = self.fingerprint(file_path)
+        self._changed = True
+
+    # Internal function returning sha1 of file contents
+    # _hash(file_path = string)
+    def _hash(self, file_path):
+        sha1 = hashlib.sha1()
+        with open(file_path, 'rb') as infile:
+            for block in iter(lambda: infile.read(1024*1024), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    # External function writing manifest to path (written to temp file then renamed), only when entries
+    # were recorded or refreshed since it was loaded or last saved
+    def save(self):
+        if not self._changed:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as outfile:
+            json.dump(self.entries, outfile, sort_keys=True)
+        os.rename(temp_path, self.path)
+        self._changed = False
+
+    def __contains__(self, name):
+        return name in self.entries
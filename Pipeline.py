@@ -0,0 +1,134 @@
+# Purpose of program is to run the full data refresh for several cryptocurrencies as one job.
+# Stages run in order (aggregation -> VADER scoring -> daily sentiment/price frames) and each
+# stage waits for the one before it, but the work inside a stage is spread across a process
+# pool: aggregation by currency and day, scoring by day file, frame building by currency and folder.
+# Frames are written in a predetermined folder structure as mapped out in
+# www.github.com/JackNelson/Capstone
+import os
+import time
+from multiprocessing import Pool, cpu_count
+import pandas as pd
+from DailyAggr import DailyAggr, _rewriteDayWorker
+import Storage
+from Sentiment_VADER import DailySentiment
+from DataAggr import getPriceDiff
+from DailyStore import DailyStore
+
+# DailySentiment objects reused within each worker process so the VADER lexicon loads once per process
+_sentiments = {}
+
+# External function to run aggregation, scoring and frame building stages for a list of cryptocurrencies
+# runPipeline(cryptos = list of strings, folders = list of strings, workers = int, price_files = dict, stages = list)
+# folders optional, defaulted to ['csv_daily'], tweet folders to score and build frames for
+# workers optional, defaulted to number of cpus, size of process pool shared by all stages
+# price_files optional, dict of crypto : OHLCV csv path written by CoinAPI._writeHistOHLCV, joined into frames
+# stages optional, defaulted to all stages, subset of ['aggregate', 'score', 'frames'] to run
+# fmt optional, defaulted to 'csv', format of day and VADER score files written ('csv', 'parquet', 'feather')
+# force optional, defaulted to False, rescore every day file instead of only new or changed ones
+# returns dictionary of stage : {'tasks': int, 'seconds': float} (score stage also has 'skipped': int)
+def runPipeline(cryptos, folders=['csv_daily'], workers=None, price_files=None, stages=None, fmt='csv', 
+                force=False):
+    if workers is None:
+        workers = cpu_count()
+    if price_files is None:
+        price_files = {}
+    if stages is None:
+        stages = ['aggregate', 'score', 'frames']
+
+    timings = {}
+    pool = Pool(workers)
+    try:
+        if 'aggregate' in stages:
+            tasks = []
+            plans = []
+            for currency in cryptos:
+                # currencies without a dump folder have nothing to aggregate
+                if not os.path.isdir("data/csv_dumps/"+currency):
+                    continue
+                obj = DailyAggr("data/csv_dumps/"+currency, "data/csv_daily/"+currency, fmt=fmt)
+                if not os.path.isdir(obj.folder_dest):
+                    os.makedirs(obj.folder_dest)
+                manifest = obj._getManifest()
+                day_tasks = obj._planNewDays(obj._getFiles(), manifest)
+                plans.append((obj, manifest, day_tasks))
+                tasks.extend(obj._dayTasks(day_tasks))
+            timings['aggregate'] = _runStage(pool, _rewriteDayWorker, tasks)
+            # record dumps only after their days have been written
+            for obj, manifest, day_tasks in plans:
+                obj._recordDays(day_tasks, manifest)
+
+        if 'score' in stages:
+            tasks = []
+            manifests = []
+            skipped = 0
+            for folder in folders:
+                for crypto in cryptos:
+                    sentiment = DailySentiment(crypto, folder, fmt)
+                    files = sentiment._getRawFiles()
+                    manifest = sentiment._getManifest()
+                    stale = sentiment._getStaleFiles(files, manifest, force)
+                    skipped += len(files) - len(stale)
+                    manifests.append((sentiment, manifest, stale))
+                    tasks.extend((crypto, folder, filename, fmt) for filename in stale)
+            timings['score'] = _runStage(pool, _scoreWorker, tasks)
+            timings['score']['skipped'] = skipped
+            # record inputs only after their days have been scored
+            for sentiment, manifest, stale in manifests:
+                for filename in stale:
+                    manifest.record(filename, sentiment._getRawPath(filename))
+                manifest.save()
+
+        if 'frames' in stages:
+            tasks = [(crypto, folder, price_files.get(crypto)) for folder in folders for crypto in cryptos]
+            timings['frames'] = _runStage(pool, _framesWorker, tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return timings
+
+# Internal function running every task of a stage on the pool and timing the stage
+# _runStage(pool = multiprocessing Pool, worker = function, tasks = list)
+def _runStage(pool, worker, tasks):
+    start = time.time()
+    # chunksize of 1 so long days do not hold up a worker's whole block of tasks
+    pool.map(worker, tasks, chunksize=1)
+    return {'tasks': len(tasks), 'seconds': time.time() - start}
+
+# Internal function writing VADER scores for a single day file
+# _scoreWorker(args = tuple of crypto, folder, filename, fmt)
+def _scoreWorker(args):
+    crypto, folder, filename, fmt = args
+    if (crypto, folder, fmt) not in _sentiments:
+        _sentiments[(crypto, folder, fmt)] = DailySentiment(crypto, folder, fmt)
+    _sentiments[(crypto, folder, fmt)].compileSentiment(filename)
+
+# Internal function writing daily polarity (and price change when available) frame for a crypto and folder
+# the daily aggregate table is brought up to date first, so only newly scored days are read
+# _framesWorker(args = tuple of crypto, folder, price_file)
+def _framesWorker(args):
+    crypto, folder, price_file = args
+    # skip crypto and folder combinations without any scored days
+    path = 'data/VADER/' + folder + '/' + crypto
+    if not os.path.isdir(path) or not Storage.listDayFiles(path):
+        return
+
+    df_price_diff = None
+    if price_file is not None:
+        df_price_diff = getPriceDiff(pd.read_csv(price_file))
+    store = DailyStore(folder, crypto)
+    store.update()
+    df_daily = store.getDailyCompare(df_price_diff)
+
+    path = 'data/frames/' + folder
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # created by another worker
+            pass
+    df_daily.to_csv(path + '/' + crypto + '.csv', index=False)
+
+if __name__ == '__main__':
+    timings = runPipeline(['Bitcoin', 'ETH', 'Ripple'])
+    for stage in ['aggregate', 'score', 'frames']:
+        print "{0}: {1} tasks in {2:.1f}s".format(stage, timings[stage]['tasks'], timings[stage]['seconds'])
@@ -1,20 +1,31 @@
 import matplotlib.pyplot as plt
+import pandas as pd
 import matplotlib.lines as mlines
 import numpy as np
 import seaborn as sns
 import matplotlib.patches
-import scipy.stats as stats
 from datetime import datetime
+from DataAggr import getOverviewStats, getBetaFit, getObjectiveRate
 plt.style.use('ggplot')
 
 def objectivePercent(df, ax=None, title=''):
+    #df: VADER score df, DailyStore daily table or getObjectiveRate output
+
     #assigning ax variable if not given for plotting
     if ax is None:
         ax = plt.gca()
         
-    #calculate percentages of scores with/without objectivity (neutral value =/!= 1)
-    objective = pd.crosstab(df['date'].astype(str), df['neu'] == 1)
-    objective_rate = objective.div(objective.sum(1).astype(float), axis=0)
+    #calculate percentages of scores with/without objectivity (neutral value =/!= 1), one row per day
+    if 'neutral_share' not in df.columns:
+        df = getObjectiveRate(df)
+    objective_rate = df[['objective_share', 'neutral_share']]
+    
+    #label each bar with its day, only the per day dates are formatted
+    dates = pd.Series(df['date'].values)
+    if dates.dtype.kind == 'M':
+        objective_rate.index = dates.dt.strftime('%Y-%m-%d').values
+    else:
+        objective_rate.index = dates.astype(str).values
     
     #plot objective_rate percentages in a stacked bar graph
     objective_rate.plot(kind='barh', ax=ax, stacked=True, color=['blue','gray'])
@@ -28,28 +39,25 @@ def objectivePercent(df, ax=None, title=''):
     ax.invert_yaxis()
     plt.tight_layout()
     
-def objectiveDistribution(df_obj, df_polar, ax=None, title=''):   
+def objectiveDistribution(df_obj, df_polar, ax=None, title='', method='moments', fits=None):
+    #method optional, defaulted to 'moments', beta fit used for both curves ('moments' or subsampled 'mle')
+    #fits optional, defaulted to None, (polarity fit, neutral fit) from getBetaFit drawn as they are,
+    #df_obj and df_polar can then be None
+
     #assigning ax variable if not given for plotting
     if ax is None:
         ax = plt.gca()
         
-    #generate distribution plot for each set of values following a beta distribution
-    sns.distplot(df_polar['value'].abs(), ax=ax, fit_kws={'color':'blue'}, fit=stats.beta, hist=None, kde=False)
-    sns.distplot(df_obj['neu'], ax=ax, fit_kws={'color':'gray'}, fit=stats.beta, hist=None, kde=False)
-    
-    #get plotted lines for shading
-    l1 = ax.lines[0]
-    l2 = ax.lines[1]
-
-    #get xy coordinate data from each plotted line for shading
-    x1 = l1.get_xydata()[:,0]
-    y1 = l1.get_xydata()[:,1]
-    x2 = l2.get_xydata()[:,0]
-    y2 = l2.get_xydata()[:,1]
-    
-    #shade between the two sets of xy coordinate data from each plotted line
-    ax.fill_between(x1,y1, color="blue", alpha=0.3)
-    ax.fill_between(x2,y2, color="gray", alpha=0.3)
+    #fit a beta distribution to each set of values (cached per dataset) on a shared grid
+    if fits is None:
+        fits = (getBetaFit(df_polar['value'].abs(), method), getBetaFit(df_obj['neu'], method))
+    polar_curve, neutral_curve = [fit['curve'] for fit in fits]
+
+    #plot each fitted density and shade underneath it
+    ax.plot(polar_curve['x'], polar_curve['density'], color='blue')
+    ax.plot(neutral_curve['x'], neutral_curve['density'], color='gray')
+    ax.fill_between(polar_curve['x'], polar_curve['density'], color="blue", alpha=0.3)
+    ax.fill_between(neutral_curve['x'], neutral_curve['density'], color="gray", alpha=0.3)
 
     #objective distribution plot formatting
     ax.legend(['Objective', 'Neutral'], loc=1)
@@ -111,26 +119,54 @@ def dailyPriceSentimentChart(df, ax=None, ax_dual=None, title=''):
     
     
 
-def dailySentimentsOverview(df, ax1=None, ax2=None, title=''):
+def dailySentimentsOverview(df, ax1=None, ax2=None, title='', summary=False):
+    #df: getPolarity frame, or getOverviewStats frame when summary is True (getPolarity frames are summarized)
+    #summary optional, defaulted to False, draw from per day boxplot statistics instead of every tweet
+    #the caller's df is never modified
+
     #assigning ax variable if not given for plotting
     if ax1 is None:
         #create figure with subplots that share a x axis and properly sized to one another
         fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(8,6), gridspec_kw={'height_ratios':[3,1]}) 
-    
-    #converting all negative polarity values to positive numbers for plotting
-    df.value = abs(df.value)
 
     #custom colors for +/- values
     colors = ['green', 'red']
 
-    #plot first subplot, boxplots for +/- polarity values by day
-    sns.boxplot(data=df, x='date', y='value', palette=colors, hue='variable', ax=ax1)
+    if summary:
+        #quartiles, whiskers, outliers and counts of each day computed in one grouped pass
+        if 'med' not in df.columns:
+            df = getOverviewStats(df)
+        _drawOverviewStats(df, ax1, ax2, colors)
+    else:
+        _drawOverviewTweets(df, ax1, ax2, colors)
     
     #polarity boxplot formatting
     ax1.set_title(title)
     ax1.set_ylabel('Polarity', color = 'k')
     ax1.tick_params('y', colors='k')
     ax1.xaxis.set_visible(False)
+
+    #get the properly spaced xlabels determined by seaborn
+    xlabels = ax2.get_xticklabels()
+
+    #polarity bar chart formatting
+    ax2.set_xlabel('Date', color = 'k')
+    ax2.tick_params('x',labelrotation=-45)
+    ax2.set_xticklabels(xlabels, ha="left")
+    ax2.tick_params('both', colors='k')
+    ax2.set_ylabel('Count', color = 'k')
+
+    #tighten subplot spacing
+    plt.subplots_adjust(hspace=.03)
+
+#draw boxplots and counts of dailySentimentsOverview from every polarity value with seaborn
+def _drawOverviewTweets(df, ax1, ax2, colors):
+    #converting all negative polarity values to positive numbers for plotting (on a copy, df is left as given)
+    #date objects converted to strings for the count plot
+    df = pd.DataFrame({'date': df['date'].astype(str), 'value': df['value'].abs(), 'variable': df['variable']})
+
+    #plot first subplot, boxplots for +/- polarity values by day
+    sns.boxplot(data=df, x='date', y='value', palette=colors, hue='variable', ax=ax1)
     ax1.legend_.set_title(None)
     ax1.legend(loc=1)
 
@@ -148,18 +184,7 @@ def dailySentimentsOverview(df, ax1=None, ax2=None, title=''):
             line.set_mec(col)
 
     #plot second subplot, bar chart showing number of +/- polarity values by day
-    df.date = df.date.astype(str) #convert date objects to strings
     sns.countplot(data=df, x='date', palette=colors, hue='variable', linewidth=2, ax=ax2)
-    
-    #get the properly spaced xlabels determined by seaborn
-    xlabels = ax2.get_xticklabels()
-
-    #polarity bar chart formatting
-    ax2.set_xlabel('Date', color = 'k')
-    ax2.tick_params('x',labelrotation=-45)
-    ax2.set_xticklabels(xlabels, ha="left")
-    ax2.tick_params('both', colors='k')
-    ax2.set_ylabel('Count', color = 'k')
     ax2.legend_.remove()
 
     #looping through all bar chart elements to remove color inside bars and change its edges to
@@ -172,5 +197,30 @@ def dailySentimentsOverview(df, ax1=None, ax2=None, title=''):
                 child.set_edgecolor(col)
                 child.set_facecolor('None')
 
-    #tighten subplot spacing
-    plt.subplots_adjust(hspace=.03)
\ No newline at end of file
+#draw boxplots and counts of dailySentimentsOverview from getOverviewStats rows, laid out like seaborn's
+#hue groups (one slot per day, pos and neg side by side)
+def _drawOverviewStats(df_stats, ax1, ax2, colors):
+    dates = np.sort(df_stats['date'].unique())
+    variables = ['pos', 'neg']
+    width = 0.8 / len(variables)
+
+    #colors and line widths as seaborn draws them
+    colors = [sns.desaturate(col, .75) for col in colors]
+    linewidth = plt.rcParams['lines.linewidth']
+
+    for i, (variable, col) in enumerate(zip(variables, colors)):
+        rows = df_stats[df_stats['variable'] == variable]
+        x = np.searchsorted(dates, rows['date'].values) - 0.4 + width*(i + 0.5)
+        boxes = [{'q1': row.q1, 'med': row.med, 'q3': row.q3, 'whislo': row.whislo, 'whishi': row.whishi,
+                  'fliers': row.fliers} for row in rows.itertuples()]
+        line_props = {'color': col, 'linewidth': linewidth}
+        ax1.bxp(boxes, positions=x, widths=width*0.8, boxprops=line_props, whiskerprops=line_props, 
+                capprops=line_props, medianprops=line_props, 
+                flierprops={'marker': 'd', 'markersize': 5, 'markerfacecolor': col, 'markeredgecolor': col})
+        ax2.bar(x, rows['count'].values, width=width, edgecolor=col, facecolor='None', linewidth=2)
+
+    ax1.legend(handles=[matplotlib.patches.Patch(facecolor=col, edgecolor='k', label=variable) 
+                        for variable, col in zip(variables, colors)], loc=1)
+    ax2.set_xticks(np.arange(len(dates)))
+    ax2.set_xticklabels(pd.Series(dates).astype(str))
+    ax2.set_xlim(-0.5, len(dates) - 0.5)
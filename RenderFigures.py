@@ -0,0 +1,155 @@
+# Purpose of program is to render the PlotsSuite charts saved in figures/ as one batch.  Each chart
+# spec names a PlotsSuite chart, the data for each of its side by side panels and the output file.
+# Specs are rendered off screen (Agg backend) across a process pool, and every output is keyed on a
+# hash of its data, parameters and chart code, so charts whose inputs have not changed are skipped.
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import pickle
+from multiprocessing import Pool, cpu_count
+import pandas as pd
+
+# figure layout of each chart: rows of axes per panel and the keyword names the axes are passed under
+# (dailySentimentsOverview draws a boxplot above a countplot sharing the x axis)
+LAYOUTS = {'objectivePercent': {'axes': ['ax']},
+           'objectiveDistribution': {'axes': ['ax']},
+           'dailyPriceSentimentChart': {'axes': ['ax']},
+           'dailySentimentsOverview': {'axes': ['ax1', 'ax2'], 'sharex': 'col',
+                                       'gridspec_kw': {'height_ratios': [3, 1]}}}
+
+# modules whose code chart output depends on: PlotsSuite draws the charts from statistics computed in DataAggr
+# (getOverviewStats, getBetaFit, getObjectiveRate)
+CHART_MODULES = ['PlotsSuite', 'DataAggr']
+
+# External function to render a list of chart specs, skipping outputs whose inputs are unchanged
+# renderCharts(specs = list of dicts, workers = int, manifest_path = string, force = bool)
+# each spec: {'chart': PlotsSuite function name, 'output': image path, 'figsize': (width, height),
+#             'panels': [{'data': [positional data args], 'title': string}, ...]} <--one panel per column
+# e.g. {'chart': 'dailyPriceSentimentChart', 'output': 'figures/dailyPriceSentiment.png', 'figsize': (15, 5),
+#       'panels': [{'data': [dailyCompare_BTC], 'title': 'BTC'}, {'data': [dailyCompare_ETH], 'title': 'ETH'}]}
+# workers optional, defaulted to number of cpus, processes rendering charts (always child processes, so the
+# caller's pyplot backend and open figures, e.g. inline notebook plotting, are left untouched)
+# manifest_path optional, defaulted to figures/.render_manifest.json, json of output : key of last render
+# force optional, defaulted to False, render every spec even when its key is unchanged
+# returns dictionary with lists of 'rendered' and 'skipped' outputs
+def renderCharts(specs, workers=None, manifest_path='figures/.render_manifest.json', force=False):
+    if workers is None:
+        workers = cpu_count()
+    manifest = _loadManifest(manifest_path)
+
+    tasks = []
+    skipped = []
+    for spec in specs:
+        key = chartKey(spec)
+        if not force and manifest.get(spec['output']) == key and os.path.exists(spec['output']):
+            skipped.append(spec['output'])
+        else:
+            tasks.append((spec, key))
+
+    rendered = []
+    try:
+        if tasks:
+            pool = Pool(max(1, min(workers, len(tasks))), initializer=_initRenderer)
+            try:
+                # chunksize of 1 so one slow chart does not hold up a worker's whole block of specs
+                for output, key in pool.imap_unordered(_renderWorker, tasks, chunksize=1):
+                    manifest[output] = key
+                    rendered.append(output)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        # charts finished before an error still count as rendered on the next run
+        _saveManifest(manifest_path, manifest)
+    return {'rendered': rendered, 'skipped': skipped}
+
+# External function returning hash of a chart spec's data, parameters and chart code
+# chartKey(spec = dict)
+def chartKey(spec):
+    sha1 = hashlib.sha1()
+    # whole modules, so changes to helpers the chart draws with or computes from also render it again
+    for name in CHART_MODULES:
+        sha1.update(inspect.getsource(importlib.import_module(name)).encode('utf-8'))
+    sha1.update(repr((spec['chart'], spec['output'], tuple(spec.get('figsize', ())))).encode('utf-8'))
+    for panel in spec['panels']:
+        sha1.update(repr(sorted((name, value) for name, value in panel.items() if name != 'data')).encode('utf-8'))
+        for data in panel['data']:
+            sha1.update(_dataHash(data))
+    return sha1.hexdigest()
+
+# Internal function returning bytes identifying the contents of a chart data argument
+# _dataHash(data = pd.DataFrame, pd.Series or picklable object)
+def _dataHash(data):
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        sha1 = hashlib.sha1()
+        columns = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+        dtypes = data.dtypes if isinstance(data, pd.DataFrame) else [data.dtype]
+        sha1.update(repr([(str(column), str(dtype)) for column, dtype in zip(columns, dtypes)]).encode('utf-8'))
+        # one 64 bit hash per row, computed in C over the columns' values and the index
+        sha1.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+        return sha1.digest()
+    return hashlib.sha1(pickle.dumps(data, 2)).digest()
+
+# Internal function run once in each rendering process to draw off screen (never in the caller's process)
+def _initRenderer():
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+
+# Internal function used by multiprocessing pool to render a single chart spec
+# _renderWorker(args = tuple of spec, key), returns output and key
+def _renderWorker(args):
+    spec, key = args
+    import matplotlib.pyplot as plt
+    import PlotsSuite
+
+    layout = LAYOUTS[spec['chart']]
+    chart = getattr(PlotsSuite, spec['chart'])
+    panels = spec['panels']
+    options = dict((name, layout[name]) for name in ['sharex', 'gridspec_kw'] if name in layout)
+    fig, axes = plt.subplots(len(layout['axes']), len(panels), figsize=spec.get('figsize'), squeeze=False,
+                             **options)
+    try:
+        for column, panel in enumerate(panels):
+            kwargs = dict((name, value) for name, value in panel.items() if name != 'data')
+            for row, name in enumerate(layout['axes']):
+                kwargs[name] = axes[row][column]
+            # charts draw through pyplot state, so the panel's axes (and with them the figure) are made current
+            plt.sca(axes[0][column])
+            chart(*panel['data'], **kwargs)
+
+        folder = os.path.dirname(spec['output'])
+        if folder and not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # created by another worker
+                pass
+        # written to a temporary file then renamed, so an interrupted render leaves the old chart in place
+        root, extension = os.path.splitext(spec['output'])
+        temp_path = root + '.tmp' + extension
+        fig.savefig(temp_path, bbox_inches='tight')
+        os.rename(temp_path, spec['output'])
+    finally:
+        plt.close(fig)
+    return spec['output'], key
+
+# Internal function returning json manifest of output : key (empty when missing)
+# _loadManifest(path = string)
+def _loadManifest(path):
+    if os.path.exists(path):
+        with open(path) as infile:
+            return json.load(infile)
+    return {}
+
+# Internal function writing manifest to path (written to temp file then renamed)
+# _saveManifest(path = string, manifest = dict)
+def _saveManifest(path, manifest):
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as outfile:
+        json.dump(manifest, outfile, sort_keys=True)
+    os.rename(temp_path, path)
@@ -0,0 +1,112 @@
+# Purpose of program is to keep coinAPI.io REST responses on disk so historical windows
+# that have already been downloaded are read locally instead of spending request quota.
+# Each response is saved as a json file named by a hash of the request parameters, and the
+# folder is kept under a size cap by evicting the least recently used files (file mtime is
+# refreshed on every hit, so the ordering survives between sessions).
+import hashlib
+import json
+import os
+import threading
+
+class ResponseCache:
+    # ResponseCache(folder = string, max_bytes = int, cache_recent = bool)
+    # max_bytes optional, defaulted to 512MB, total size of cached responses before eviction
+    # cache_recent optional, defaulted to False, allow caching of windows that touch the present
+    def __init__(self, folder='data/api_cache', max_bytes=512*1024*1024, cache_recent=False):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.cache_recent = cache_recent
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        # running total of cached bytes, scanned once so puts do not need to walk the folder
+        self._bytes = sum(size for path, size, mtime in self._getEntries())
+
+    # External function returning content address for a request
+    # key(params = dict of request parameters such as endpoint, symbol_id, period_id, time_start, time_end, limit)
+    def key(self, params):
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    # External function returning cached response for key, or None when not cached
+    # get(key = string)
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as infile:
+                value = json.load(infile)
+            # refresh mtime so least recently used ordering reflects this hit
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return value
+
+    # External function saving response for key, evicting least recently used responses over max_bytes
+    # put(key = string, value = json serializable response)
+    def put(self, key, value):
+        path = self._path(key)
+        temp_path = path + '.tmp' + str(threading.current_thread().ident)
+        with open(temp_path, 'w') as outfile:
+            json.dump(value, outfile)
+        size = os.path.getsize(temp_path)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        # rename so readers never see a partially written response
+        os.rename(temp_path, path)
+
+        with self._lock:
+            self.stats['writes'] += 1
+            self._bytes += size - previous
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    # External function returning hit/miss counters along with current entries and size on disk
+    def getStats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['bytes'] = self._bytes
+        stats['entries'] = len(self._getEntries())
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = float(stats['hits']) / lookups if lookups else 0.0
+        return stats
+
+    # External function removing every cached response
+    def clear(self):
+        with self._lock:
+            for path, size, mtime in self._getEntries():
+                os.remove(path)
+            self._bytes = 0
+
+    # Internal function removing oldest accessed responses until cache is under max_bytes (lock held by caller)
+    def _evict(self):
+        for path, size, mtime in sorted(self._getEntries(), key=lambda entry: entry[2]):
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._bytes -= size
+            self.stats['evictions'] += 1
+
+    # Internal function listing (path, size, mtime) of cached responses
+    def _getEntries(self):
+        entries = []
+        for filename in os.listdir(self.folder):
+            if filename.endswith('.json'):
+                path = os.path.join(self.folder, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    # Internal function returning file path for key
+    # _path(key = string)
+    def _path(self, key):
+        return os.path.join(self.folder, key + '.json')
@@ -1,14 +1,40 @@
+import numpy as np
 import pandas as pd
 import preprocessor as p
+from preprocessor.defines import Patterns
 from nltk.tokenize import TweetTokenizer
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import json
 import csv
 import os
 import re
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+import Storage
+from Manifest import Manifest
+
+# sentiment intensity analyzer loaded once in each scoring worker process (see _initScorer)
+_workerAnalyzer = None
+
+# patterns applied by _cleanTweets, in the order preprocessor.clean applies them for URL, MENTION and RESERVED
+# (unwanted symbols first, then mentions, reserved words and links) compiled once at import
+SYMBOL_PATTERN = re.compile('[#?"]')
+CLEAN_PATTERNS = [SYMBOL_PATTERN, Patterns.MENTION_PATTERN, Patterns.RESERVED_WORDS_PATTERN, Patterns.URL_PATTERN]
+
+# columns of VADER score files
+SCORE_COLUMNS = ['compound', 'neg', 'neu', 'pos']
+
+# VADER rounds compound to 4 decimals and neg/neu/pos to 3, so float32 scores rounded back to 4 decimals
+# give the exact values csv files have always held
+SCORE_DECIMALS = 4
 
 class DailySentiment:
-    def __init__(self, crypto, folder):
+    # fmt optional, defaulted to 'csv', format of written VADER score files ('csv', 'parquet', 'feather')
+    # workers optional, defaulted to 1, number of processes scoring tweets (1 scores in this process)
+    # chunksize optional, defaulted to 5000, number of tweets sent to a worker process at a time
+    # cache_size optional, defaulted to 0 (off), number of cleaned tweet scores kept across files for reuse
+    def __init__(self, crypto, folder, fmt='csv', workers=1, chunksize=5000, cache_size=0):
         # instantiate tweet tokenizer from nltk.tokenize, set to remove handles and reduce repeating characters
         self._tweetProcessor = TweetTokenizer(strip_handles=False, reduce_len=True)
         # instantiate sentiment intensity analyzer from nltk.sentiment.vader
@@ -16,6 +42,19 @@ class DailySentiment:
         
         self.crypto = crypto
         self.folder = folder
+        self.fmt = fmt
+        self.workers = workers
+        self.chunksize = chunksize
+        # scoring pool created on first parallel scoring call and reused across files
+        self._pool = None
+        self._poolWorkers = 0
+        
+        # scores of cleaned tweets shared across files (None when disabled)
+        self.scoreCache = ScoreCache(cache_size) if cache_size > 0 else None
+        # dedup statistics of last getSentimentScores call and of each compiled file
+        self.lastStats = {}
+        self.fileStats = {}
+        self._secondsPerScore = 0.0
     
     # ---- OBSOLETE FUNCTION BELOW ---- UNSUPPORTED: DO NOT USE
     # External function to return average VADER polarity score
@@ -25,45 +64,192 @@ class DailySentiment:
     def getDailySentiment(self, df, keyword=None, filterTweets=True, noninfluence=True):
         scores = self.getSentimentScores(df, keyword, filterTweets, noninfluence)
         
-        avg_scores = {'neg': sum(score['neg'] for score in scores) / len(scores),
-                      'neu': sum(score['neu'] for score in scores) / len(scores),
-                      'pos': sum(score['pos'] for score in scores) / len(scores),
-                      'compound': sum(score['compound'] for score in scores) / len(scores)}
+        avg_scores = scores.astype(float).mean().to_dict()
         return avg_scores
     # ---- OBSOLETE FUNCTION ABOVE ---- UNSUPPORTED: DO NOT USE
     
     # External function to write csv files of VADER sentiment scores across tweet files in object given folder
-    def compileSentiments(self):
+    # only days that are new or changed since they were last scored (per the output folder's manifest) are scored
+    # compileSentiments(read_chunksize = int, force = bool, use_hash = bool)
+    # read_chunksize optional, defaulted to None (whole files), rows read, filtered, scored and written at a time
+    # force optional, defaulted to False, rescore every file regardless of the manifest
+    # use_hash optional, defaulted to False, also compare content hashes of inputs whose size or mtime changed
+    # returns dictionary with lists of 'processed' and 'skipped' files
+    def compileSentiments(self, read_chunksize=None, force=False, use_hash=False):
         # get list of daily tweet files in folder 
         files = self._getRawFiles()
+        manifest = self._getManifest(use_hash)
+        stale = self._getStaleFiles(files, manifest, force)
         # loop through each folder and save csv
+        for filename in stale:
+            self.compileSentiment(filename, read_chunksize)
+            # saved after every file so an interrupted run keeps the days already scored
+            manifest.record(filename, self._getRawPath(filename))
+            manifest.save()
+        # inputs recorded without rescoring (output already newer) are kept even when nothing was stale
+        manifest.save()
+        
+        summary = {'processed': stale, 'skipped': [filename for filename in files if filename not in stale]}
+        print "{0} {1}: {2} files scored, {3} unchanged files skipped".format(self.crypto, self.folder, 
+                                                                             len(summary['processed']), 
+                                                                             len(summary['skipped']))
+        return summary
+    
+    # Internal function returning manifest of scored input files kept in the VADER output folder
+    # _getManifest(use_hash = bool)
+    def _getManifest(self, use_hash=False):
+        return Manifest('data/VADER/' + self.folder + '/' + self.crypto + '/.score_manifest.json', use_hash)
+    
+    # Internal function returning files that need scoring: new or changed inputs, or missing output
+    # an input without a manifest entry whose output is already newer than it is recorded instead of rescored
+    # _getStaleFiles(files = list of strings, manifest = Manifest, force = bool)
+    def _getStaleFiles(self, files, manifest, force=False):
+        if force:
+            return list(files)
+        stale = []
         for filename in files:
-            df = self._openTweets(filename)
-            
-            if self.folder == 'csv_daily':
-                scores = self.getSentimentScores(df, keyword=self.crypto)
-            else:
-                scores = self.getSentimentScores(df, keyword=self.crypto, noninfluence=False)
+            raw_path = self._getRawPath(filename)
+            output_path = self._getSentimentPath(filename)
+            if not os.path.exists(output_path):
+                stale.append(filename)
+            elif filename not in manifest:
+                if os.path.getmtime(output_path) >= os.path.getmtime(raw_path):
+                    manifest.record(filename, raw_path)
+                else:
+                    stale.append(filename)
+            elif manifest.isChanged(filename, raw_path):
+                stale.append(filename)
+        return stale
+    
+    # External function to write csv file of VADER sentiment scores for a single tweet file in object given folder
+    # compileSentiment(filename = string, read_chunksize = int)
+    # read_chunksize optional, defaulted to None, when given the file is scored in chunks of this many rows and
+    # scores are appended to the output as each chunk finishes. csv and parquet days are streamed, so memory stays
+    # bounded regardless of day size; feather days cannot be read partially and are still loaded whole
+    def compileSentiment(self, filename, read_chunksize=None):
+        self._makeSentimentFolder()
+        if read_chunksize is None:
+            scores = self._scoreTweets(self._openTweets(filename))
+            self.fileStats[filename] = self.lastStats
             self._writeSentiment(filename, scores)
+            return
+        
+        writer = Storage.FrameWriter(self._getSentimentPath(filename), SCORE_COLUMNS)
+        chunk_stats = []
+        for df in self._iterTweets(filename, read_chunksize):
+            scores = self._scoreTweets(df)
+            chunk_stats.append(self.lastStats)
+            writer.write(self._formatScores(scores, writer.fmt))
+        writer.close()
+        self.fileStats[filename] = _sumStats(chunk_stats)
+    
+    # Internal function scoring tweets with the filters used for the object given folder
+    # _scoreTweets(df = dataframe)
+    def _scoreTweets(self, df):
+        if self.folder == 'csv_daily':
+            return self.getSentimentScores(df, keyword=self.crypto)
+        else:
+            return self.getSentimentScores(df, keyword=self.crypto, noninfluence=False)
             
     
-    # External function to return a list of VADER polarity scores
+    # External function to return VADER polarity scores as a dataframe of float32 columns (SCORE_COLUMNS),
+    # one row per tweet kept by the filters and indexed like those rows of df
     # getSentimentScores(df = dataframe, keyword = string, filterTweets = boolean, noninfluence = boolean)
     # keyword: search term tweets were queried with
     # filterTweets and noninfluence: booleans to run/skip particular preprocessing function
-    def getSentimentScores(self, df, keyword=None, filterTweets=True, noninfluence=True):
+    # workers and chunksize optional, defaulted to object settings, scores are returned in input order either way
+    # each distinct cleaned tweet is scored once and its score repeated for every row with that text
+    def getSentimentScores(self, df, keyword=None, filterTweets=True, noninfluence=True, workers=None, chunksize=None):
         if (filterTweets and keyword != None):
             df = self._filterTweets(df, keyword)
         if noninfluence:
             df = self._removeNoninfluencers(df)
         
+        workers = self.workers if workers is None else workers
+        chunksize = self.chunksize if chunksize is None else chunksize
         list_of_tweets = df.text
-        scores = []
-        for tweet in list_of_tweets:
-            tweet = self._cleanTweet(tweet)
-            scores.append(self._vaderAnalyzer.polarity_scores(tweet))
+        start = time.time()
+        
+        # clean each distinct raw tweet once (retweets and spam repeat the same text)
+        raw_codes, raw_tweets = pd.factorize(list_of_tweets)
+        raw_tweets = [tweet if isinstance(tweet, basestring) else str(tweet) for tweet in raw_tweets]
+        # missing text (factorized to -1) is scored as an empty tweet, like blank lines of coin_tweets files
+        missing = raw_codes < 0
+        if missing.any():
+            raw_codes[missing] = len(raw_tweets)
+            raw_tweets.append('')
+        cleaned = self._cleanTweets(pd.Series(raw_tweets, dtype=object))
+        # position of each row's cleaned tweet among the distinct cleaned tweets
+        clean_codes, unique_tweets = pd.factorize(cleaned)
+        codes = clean_codes[raw_codes]
+        
+        # one row of scores per distinct cleaned tweet, taken from the cross file cache when possible
+        unique_scores = np.empty((len(unique_tweets), len(SCORE_COLUMNS)), dtype=np.float32)
+        to_score = []
+        cache_hits = 0
+        for i, tweet in enumerate(unique_tweets):
+            score = self.scoreCache.get(tweet) if self.scoreCache is not None else None
+            if score is None:
+                to_score.append(i)
+            else:
+                cache_hits += 1
+                unique_scores[i] = score
+        
+        score_start = time.time()
+        texts = [unique_tweets[i] for i in to_score]
+        for i, tweet, score in zip(to_score, texts, self._scoreTexts(texts, workers, chunksize)):
+            unique_scores[i] = score
+            if self.scoreCache is not None:
+                self.scoreCache.put(tweet, score)
+        score_seconds = time.time() - score_start
+        
+        # gathered column-major so each score column is a contiguous float32 array
+        scores = pd.DataFrame(unique_scores.T.take(codes, axis=1).T, columns=SCORE_COLUMNS, index=df.index)
+        
+        # time saved estimated from the latest average time to score one distinct tweet
+        if to_score:
+            self._secondsPerScore = score_seconds / len(to_score)
+        skipped = len(scores) - len(to_score)
+        self.lastStats = {'tweets': len(scores), 'unique': len(unique_tweets), 'scored': len(to_score), 
+                          'cache_hits': cache_hits, 
+                          'dedup_ratio': 1 - float(len(unique_tweets)) / len(scores) if len(scores) else 0.0,
+                          'seconds': time.time() - start, 'seconds_saved': skipped * self._secondsPerScore}
         return scores        
     
+    # Internal function scoring cleaned tweets in order, in this process or across worker processes
+    # _scoreTexts(tweets = list of strings, workers = int, chunksize = int)
+    def _scoreTexts(self, tweets, workers, chunksize):
+        if workers > 1 and len(tweets) > chunksize:
+            chunks = [tweets[i:i + chunksize] for i in range(0, len(tweets), chunksize)]
+            # imap keeps chunk order, so scores line up with input tweets
+            scores = []
+            for chunk_scores in self._getPool(workers).imap(_scoreChunk, chunks):
+                scores.extend(chunk_scores)
+            return scores
+        
+        return [_scoreRow(self._vaderAnalyzer.polarity_scores(tweet)) for tweet in tweets]
+    
+    # External function returning dedup statistics for each compiled file along with overall totals
+    def getDedupStats(self):
+        return {'files': dict(self.fileStats), 'total': _sumStats(self.fileStats.values())}
+    
+    # External function to shut down scoring worker processes
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+    
+    # Internal function returning scoring pool, (re)created when the requested worker count changes
+    # _getPool(workers = int)
+    def _getPool(self, workers):
+        if self._pool is not None and self._poolWorkers != workers:
+            self.close()
+        if self._pool is None:
+            self._pool = Pool(workers, initializer=_initScorer)
+            self._poolWorkers = workers
+        return self._pool
+    
     # Internal function to remove tweets without keyword (BUG FIX)
     # _filterTweets(df = dataframe, keyword = string)
     def _filterTweets(self, df, keyword):
@@ -82,12 +268,12 @@ class DailySentiment:
     # Internal function that goes through several text preprocessing steps
     # _cleanTweet(tweet = string)
     def _cleanTweet(self, tweet):
-        # set preprocessor to remove links, mentions, and reserved words (FAV, RT, etc.)
-        p.set_options(p.OPT.URL, p.OPT.MENTION, p.OPT.RESERVED)
-        # clean tweet with preprocessor and remove unwanted symbols (hashtags, quotes, question marks)
-        tweet = p.clean(tweet.translate(None, '#?"'))
-
-        return tweet 
+        return _cleanText(tweet)
+    
+    # Internal function that applies the _cleanTweet preprocessing steps to a whole series of tweets at once
+    # _cleanTweets(tweets = pd.Series of strings)
+    def _cleanTweets(self, tweets):
+        return _cleanTexts(tweets)
     
     # Internal function that opens .txt containing tweets in object given folder
     # _openTweets(filename = string)    
@@ -95,28 +281,87 @@ class DailySentiment:
         # construct folder path where files reside
         if self.folder == 'csv_daily':
             path = 'data/' + self.folder + '/' + self.crypto + '/' + filename
-            df = pd.read_csv(path, lineterminator='\n')
+            # only columns used for filtering and scoring are read (csv, parquet or feather)
+            df = Storage.readFrame(path, columns=['text', 'user_followers_count'], lineterminator='\n')
         else:
             path = 'data/' + self.folder + '/' + '/' + filename
             lines = open(path,'r').read().split('\n')
             df = pd.DataFrame(data={'text':lines})      
                 
         return df
+    
+    # Internal function that yields tweets from a file in object given folder chunksize rows at a time
+    # _iterTweets(filename = string, chunksize = int)
+    def _iterTweets(self, filename, chunksize):
+        if self.folder == 'csv_daily':
+            path = 'data/' + self.folder + '/' + self.crypto + '/' + filename
+            for df in Storage.iterFrame(path, columns=['text', 'user_followers_count'], chunksize=chunksize, 
+                                        lineterminator='\n'):
+                yield df
+        else:
+            path = 'data/' + self.folder + '/' + '/' + filename
+            lines = []
+            # same rows as _openTweets split on '\n', including the empty row after a trailing newline
+            ends_newline = True
+            with open(path, 'r') as infile:
+                for line in infile:
+                    ends_newline = line.endswith('\n')
+                    lines.append(line[:-1] if ends_newline else line)
+                    if len(lines) == chunksize:
+                        yield pd.DataFrame(data={'text':lines})
+                        lines = []
+            if ends_newline:
+                lines.append('')
+            if lines:
+                yield pd.DataFrame(data={'text':lines})
+    
+    # Internal function returning path of a tweet file in object given folder
+    # _getRawPath(filename = string)
+    def _getRawPath(self, filename):
+        if self.folder == 'csv_daily':
+            return 'data/' + self.folder + '/' + self.crypto + '/' + filename
+        return 'data/' + self.folder + '/' + filename
+    
+    # Internal function returning path VADER scores for a tweet file are written to
+    # _getSentimentPath(filename = string)
+    def _getSentimentPath(self, filename):
+        return Storage.withFormat('data/VADER/' + self.folder + '/' + self.crypto + '/' + filename, self.fmt)
         
+    # Internal function creating the folder VADER scores are written to when it does not exist yet
+    def _makeSentimentFolder(self):
+        folder = 'data/VADER/' + self.folder + '/' + self.crypto
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                # created by another process
+                pass
+    
+    # Internal function returning scores as written to a score file of format fmt: csv keeps the float64 values
+    # VADER rounded to, columnar files store the float32 columns as they are
+    # _formatScores(scores = dataframe, fmt = string) <--format of the score file, as given by its extension
+    def _formatScores(self, scores, fmt):
+        if fmt == 'csv':
+            return scores.astype(float).round(SCORE_DECIMALS)
+        return scores
+    
     # Internal function that writes .txt containing VADER sentiment results for each tweet
-    # _writeSentiment(filename = string)
+    # _writeSentiment(filename = string, scores = dataframe)
     def _writeSentiment(self, filename, scores):
         # construct folder path where files to be written
-        path = 'data/VADER/' + self.folder + '/' + self.crypto + '/' + filename
+        path = self._getSentimentPath(filename)
+        fmt = Storage.getFormat(path)
+        scores = self._formatScores(scores, fmt)
+        
+        if fmt != 'csv':
+            Storage.writeFrame(scores, path)
+            return
         
         with open(path, 'w') as outfile:
             rowWriter = csv.writer(outfile)       
             # write header
-            rowWriter.writerow(['compound', 'neg', 'neu', 'pos'])
-        
-            for score in scores:
-                rowWriter.writerow([score['compound'], score['neg'], score['neu'], score['pos']])
-            outfile.close()
+            rowWriter.writerow(SCORE_COLUMNS)
+            rowWriter.writerows(scores.values.tolist())
         
     # Internal function extracting list of csv files in folder
     # _getRawFiles(folder = string)
@@ -124,6 +369,11 @@ class DailySentiment:
         # construct folder path where files reside
         if self.folder == 'csv_daily':
             path = str(os.getcwd()) + '/data/' + self.folder + '/' + self.crypto
+            # cryptocurrencies without aggregated days have no folder yet
+            if not os.path.isdir(path):
+                return []
+            # one file per day in any stored format
+            return Storage.listDayFiles(path)
         else:
             path = str(os.getcwd()) + '/data/' + self.folder
                     
@@ -135,4 +385,96 @@ class DailySentiment:
         for csv_path in os.listdir(path):
             if reg.search(csv_path):
                  files.append(csv_path)
-        return files
\ No newline at end of file
+        return files
+
+# Cache of VADER scores keyed on cleaned tweet text, evicting least recently used scores over max_entries
+class ScoreCache:
+    # ScoreCache(max_entries = int)
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+    
+    # External function returning cached score (None when missing) and marking it recently used
+    # get(tweet = string)
+    def get(self, tweet):
+        score = self._entries.pop(tweet, None)
+        if score is not None:
+            self._entries[tweet] = score
+        return score
+    
+    # External function adding score to cache
+    # put(tweet = string, score = tuple of SCORE_COLUMNS values)
+    def put(self, tweet, score):
+        self._entries.pop(tweet, None)
+        self._entries[tweet] = score
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._entries)
+
+# Internal function adding up dedup statistics of several getSentimentScores calls
+# _sumStats(list_of_stats = list of lastStats dictionaries)
+def _sumStats(list_of_stats):
+    totals = {'tweets': 0, 'unique': 0, 'scored': 0, 'cache_hits': 0, 'seconds': 0.0, 'seconds_saved': 0.0}
+    for stats in list_of_stats:
+        for key in totals:
+            totals[key] += stats.get(key, 0)
+    totals['dedup_ratio'] = 1 - float(totals['unique']) / totals['tweets'] if totals['tweets'] else 0.0
+    return totals
+
+# Internal function that goes through several text preprocessing steps (shared by DailySentiment and worker processes)
+# _cleanText(tweet = string)
+def _cleanText(tweet):
+    # set preprocessor to remove links, mentions, and reserved words (FAV, RT, etc.)
+    p.set_options(p.OPT.URL, p.OPT.MENTION, p.OPT.RESERVED)
+    # clean tweet with preprocessor and remove unwanted symbols (hashtags, quotes, question marks)
+    tweet = p.clean(tweet.translate(None, '#?"'))
+
+    return tweet
+
+# Internal function applying the _cleanText preprocessing steps to a whole series of tweets at once
+# (shared by DailySentiment and checkCleanTweets)
+# _cleanTexts(tweets = pd.Series of strings)
+def _cleanTexts(tweets):
+    for pattern in CLEAN_PATTERNS:
+        tweets = tweets.str.replace(pattern, '')
+    # collapse whitespace as preprocessor.clean does
+    return tweets.str.split().str.join(' ')
+
+# External function checking the batch cleaning of DailySentiment._cleanTweets against the per tweet _cleanText
+# and the stored outputs of a golden set of edge case tweets (retweets, FAV, urls with punctuation, emoji, empty
+# text, bare symbols).  Both cleanings lean on preprocessor internals (its cleaner order and Patterns names), so
+# this is rerun whenever tweet-preprocessor is upgraded
+# checkCleanTweets(golden_path = string) <--json list of {'tweet', 'cleaned'}
+# golden_path optional, defaulted to data/golden/clean_tweets.json
+# returns list of (tweet, expected, batch cleaned, per tweet cleaned) for every tweet that does not match
+def checkCleanTweets(golden_path='data/golden/clean_tweets.json'):
+    with open(golden_path) as infile:
+        golden = json.load(infile)
+    # tweets are read from csv as utf-8 byte strings
+    tweets = [row['tweet'].encode('utf-8') for row in golden]
+    expected = [row['cleaned'].encode('utf-8') for row in golden]
+    
+    batch = _cleanTexts(pd.Series(tweets, dtype=object)).tolist()
+    reference = [_cleanText(tweet) for tweet in tweets]
+    mismatches = [row for row in zip(tweets, expected, batch, reference) if not row[1] == row[2] == row[3]]
+    for tweet, cleaned, batch_cleaned, reference_cleaned in mismatches:
+        print "cleaning mismatch: ", repr(tweet), repr(cleaned), repr(batch_cleaned), repr(reference_cleaned)
+    print "{0} of {1} golden tweets cleaned as expected".format(len(tweets) - len(mismatches), len(tweets))
+    return mismatches
+
+# Internal function run once in each scoring worker process to load the VADER lexicon
+def _initScorer():
+    global _workerAnalyzer
+    _workerAnalyzer = SentimentIntensityAnalyzer()
+
+# Internal function scoring a chunk of cleaned tweets in a worker process
+# _scoreChunk(tweets = list of strings)
+def _scoreChunk(tweets):
+    return [_scoreRow(_workerAnalyzer.polarity_scores(tweet)) for tweet in tweets]
+
+# Internal function returning a VADER polarity_scores dictionary as a tuple in SCORE_COLUMNS order
+# _scoreRow(score = dict)
+def _scoreRow(score):
+    return (score['compound'], score['neg'], score['neu'], score['pos'])
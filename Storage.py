@@ -0,0 +1,155 @@
+# Purpose of program is to read and write the daily tweet and VADER score files in either
+# csv or a typed columnar format (parquet or feather, both through pyarrow).  Columnar files
+# keep column types so they load without text parsing and can be read one column at a time.
+# Readers detect the format from the file extension, so folders can hold any mix of formats
+# and existing csv files keep working.
+import csv
+import os
+import re
+import pandas as pd
+
+# file extension for each supported format (.txt files are csv content, as written for coin_tweets)
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+FORMATS = {'.csv': 'csv', '.txt': 'csv', '.parquet': 'parquet', '.feather': 'feather'}
+
+# preferred format when a day exists in more than one format (columnar copies are newer conversions)
+PREFERENCE = ['.parquet', '.feather', '.csv', '.txt']
+
+# rows per parquet row group, parquet files are read back one row group at a time so this bounds the memory of
+# a streamed read of a parquet day however large the day is
+ROW_GROUP_SIZE = 10000
+
+# regex to get 8 digit day code in filename timestamp
+DAY_REGEX = re.compile("\d{8}")
+
+# External function returning format of a file based on its extension
+# getFormat(path = string)
+def getFormat(path):
+    extension = os.path.splitext(path)[1]
+    if extension not in FORMATS:
+        raise ValueError("Unsupported file format: " + path)
+    return FORMATS[extension]
+
+# External function returning path with its extension replaced by the extension of fmt
+# (csv content keeps a .txt extension, as written for coin_tweets)
+# withFormat(path = string, fmt = string)
+def withFormat(path, fmt):
+    stem, extension = os.path.splitext(path)
+    if fmt == 'csv' and FORMATS.get(extension) == 'csv':
+        return path
+    return stem + EXTENSIONS[fmt]
+
+# External function writing dataframe to path in the format given by its extension
+# writeFrame(df = pd.DataFrame, path = string)
+def writeFrame(df, path):
+    fmt = getFormat(path)
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False, row_group_size=ROW_GROUP_SIZE)
+    elif fmt == 'feather':
+        # feather only stores a default index
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+# External function reading dataframe from path in the format given by its extension
+# readFrame(path = string, columns = list of strings, **csv_kwargs = extra pd.read_csv arguments)
+# columns optional, defaulted to None (all columns), only these columns are read from disk
+def readFrame(path, columns=None, **csv_kwargs):
+    fmt = getFormat(path)
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    elif fmt == 'feather':
+        return pd.read_feather(path, columns=columns)
+    else:
+        if columns is not None:
+            csv_kwargs['usecols'] = columns
+        return pd.read_csv(path, **csv_kwargs)
+
+# External function reading a file in pieces so large days never sit fully in memory
+# iterFrame(path = string, columns = list of strings, chunksize = int, **csv_kwargs = extra pd.read_csv arguments)
+# csv and parquet are yielded chunksize rows at a time, parquet is read from disk one row group at a time (at most
+# ROW_GROUP_SIZE rows for files written here, files from elsewhere may hold larger groups)
+# feather cannot be read partially, so a feather file is loaded whole and only yielded in chunksize pieces
+def iterFrame(path, columns=None, chunksize=100000, **csv_kwargs):
+    fmt = getFormat(path)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        for i in range(parquet_file.num_row_groups):
+            for df in _sliceFrame(parquet_file.read_row_group(i, columns=columns).to_pandas(), chunksize):
+                yield df
+    elif fmt == 'feather':
+        for df in _sliceFrame(pd.read_feather(path, columns=columns), chunksize):
+            yield df
+    else:
+        if columns is not None:
+            csv_kwargs['usecols'] = columns
+        for df in pd.read_csv(path, chunksize=chunksize, **csv_kwargs):
+            yield df
+
+# Internal function splitting a dataframe into pieces of at most chunksize rows (an empty frame is one piece)
+# _sliceFrame(df = pd.DataFrame, chunksize = int)
+def _sliceFrame(df, chunksize):
+    for start in range(0, max(len(df), 1), chunksize):
+        yield df.iloc[start:start + chunksize].reset_index(drop=True)
+
+# Writer appending dataframes to a single file as they are produced, the file only appears at path once
+# close() is called (written to a temporary file then renamed), so an interrupted write leaves no partial output
+class FrameWriter:
+    # FrameWriter(path = string, columns = list of strings) <--columns written even if no rows are ever added
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.fmt = getFormat(path)
+        self._temp_path = path + '.tmp' + os.path.splitext(path)[1]
+        self._written = False
+        self._writer = None
+        # feather files cannot be appended to, pieces are held until close
+        self._pieces = []
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    # External function appending rows of df to the file
+    # write(df = pd.DataFrame)
+    def write(self, df):
+        df = df[self.columns]
+        if self.fmt == 'parquet':
+            import pyarrow
+            import pyarrow.parquet as pq
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self._temp_path, table.schema)
+            self._writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+        elif self.fmt == 'feather':
+            self._pieces.append(df)
+        else:
+            # csv module writer, same output as the row by row csv files written elsewhere in the project
+            with open(self._temp_path, 'ab') as outfile:
+                rowWriter = csv.writer(outfile)
+                if not self._written:
+                    rowWriter.writerow(self.columns)
+                rowWriter.writerows(df.values.tolist())
+        self._written = True
+
+    # External function finishing the file and moving it to path
+    def close(self):
+        if self.fmt == 'feather':
+            pieces = self._pieces or [pd.DataFrame(columns=self.columns)]
+            writeFrame(pd.concat(pieces, ignore_index=True), self._temp_path)
+        elif not self._written:
+            self.write(pd.DataFrame(columns=self.columns))
+        if self._writer is not None:
+            self._writer.close()
+        os.rename(self._temp_path, self.path)
+
+# External function listing one file per day in a folder, preferring columnar copies of a day
+# listDayFiles(path = string), returns list of file names
+def listDayFiles(path):
+    days = {}
+    for filename in os.listdir(path):
+        stem, extension = os.path.splitext(filename)
+        if extension not in FORMATS or not DAY_REGEX.search(filename):
+            continue
+        if stem not in days or PREFERENCE.index(extension) < PREFERENCE.index(os.path.splitext(days[stem])[1]):
+            days[stem] = filename
+    return sorted(days.values())
@@ -0,0 +1,315 @@
+# Purpose of program is to collect tweets for several cryptocurrency keywords at once and dump them
+# into csv files under the naming convention DailyAggr aggregates (currency_YYYYMMDD-HHMMSS).  Each
+# status is turned into a csv row as soon as it arrives and buffered, buffers are appended to the
+# currency's open dump file whenever they fill, and at the end of every rotation period (aligned to the
+# clock, e.g. on the hour) each currency's rows are written out and its dump closed, so a collector can
+# run for days with the same memory and throughput and never holds more than one period of rows.
+# Statuses come from a source, any callable search(query, since_id) returning tweepy style status
+# objects, so a recorded-status source can stand in for the twitter API when testing.  Dumps are saved
+# in a predetermined folder structure (data/csv_dumps/<currency>) as mapped out in
+# www.github.com/JackNelson/Capstone
+import csv
+import json
+import os
+import time
+# imported up front: the first datetime.strptime of a python 2 process imports it lazily, which is not thread safe,
+# and recorded statuses are parsed inside the search threads
+import _strptime
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+# columns of each dump file, in order (as written by the original tweepy extraction scripts)
+COLUMNS = ['id', 'text', 'created_at', 'retweet_count', 'favorite_count', 'source', 'user_id',
+           'user_screen_name', 'user_name', 'user_created_at', 'user_description', 'user_followers_count',
+           'user_friends_count', 'user_location']
+
+# folder inside each currency folder holding dump files still being written (its name has no day code,
+# so DailyAggr never picks up a partial dump)
+PARTIAL_FOLDER = '.partial'
+
+# twitter timestamp format of created_at fields in status json
+TWITTER_TIME = '%a %b %d %H:%M:%S +0000 %Y'
+
+class TweetCollector:
+    # TweetCollector(keywords = dict, folder = string, rotate_seconds = int, buffer_rows = int, clock = function)
+    # keywords: dict of currency : search query, e.g. {'Bitcoin': 'Bitcoin', 'ETH': 'ethereum'}
+    # folder optional, defaulted to data/csv_dumps, dumps written to <folder>/<currency>
+    # rotate_seconds optional, defaulted to 3600, length of the clock aligned periods each dump file covers
+    # buffer_rows optional, defaulted to 1000, rows held per currency before they are appended to its dump
+    # clock optional, defaulted to time.time, returns current time in seconds (replaceable when testing)
+    def __init__(self, keywords, folder='data/csv_dumps', rotate_seconds=3600, buffer_rows=1000, clock=time.time):
+        self.keywords = keywords
+        self.folder = folder
+        self.rotate_seconds = rotate_seconds
+        self.buffer_rows = buffer_rows
+        self.clock = clock
+        self.stats = {'rounds': 0, 'statuses': 0, 'duplicates': 0, 'rows_written': 0, 'files': 0}
+        # newest status id seen per currency, so each search only returns statuses not yet collected
+        self.since_ids = dict((currency, None) for currency in keywords)
+        self._buffers = dict((currency, []) for currency in keywords)
+        # currency : start of the rotation period its buffered rows and open dump belong to
+        self._periods = {}
+        # currency : [open file, partial path, final path]
+        self._dumps = {}
+        for currency in keywords:
+            self._recoverPartials(currency)
+
+    # External function running search rounds over every keyword until duration has passed
+    # collect(source = function, duration = int, interval = int, rounds = int, workers = int, sleep = function)
+    # source: search(query, since_id) returning iterable of statuses, e.g. TweepySource or RecordedSource
+    # duration optional, defaulted to None (until rounds run out or interrupted), seconds to collect for
+    # interval optional, defaulted to 60, seconds between the start of consecutive rounds
+    # rounds optional, defaulted to None (no limit), largest number of search rounds to run
+    # workers optional, defaulted to number of keywords, threads searching keywords at the same time
+    # sleep optional, defaulted to time.sleep (replaceable when testing)
+    def collect(self, source, duration=None, interval=60, rounds=None, workers=None, sleep=time.sleep):
+        currencies = sorted(self.keywords)
+        pool = ThreadPool(max(1, min(workers or len(currencies), len(currencies))))
+        start = self.clock()
+        try:
+            while rounds is None or self.stats['rounds'] < rounds:
+                round_start = self.clock()
+                if duration is not None and round_start - start >= duration:
+                    break
+                # searches wait on the network, so keywords are searched concurrently and rows come back
+                # already converted, the status objects are never held past their own search
+                results = pool.map(lambda currency: self._search(source, currency), currencies)
+                for currency, (rows, newest, duplicates) in zip(currencies, results):
+                    self.stats['statuses'] += len(rows)
+                    self.stats['duplicates'] += duplicates
+                    self.addRows(currency, rows)
+                    if newest is not None:
+                        self.since_ids[currency] = newest
+                self.stats['rounds'] += 1
+                self.rotate()
+                sleep(max(0, interval - (self.clock() - round_start)))
+        finally:
+            pool.close()
+            pool.join()
+            self.close()
+        return self.stats
+
+    # External function adding converted rows for a currency, appending them to its dump when the buffer fills
+    # addRows(currency = string, rows = list of lists from statusRow)
+    def addRows(self, currency, rows):
+        if not rows:
+            return
+        period = self._period(self.clock())
+        # rows of an earlier period are written out first so every dump only covers its own period
+        if self._periods.get(currency, period) != period:
+            self._endPeriod(currency)
+        self._periods[currency] = period
+        buffer = self._buffers[currency]
+        buffer.extend(rows)
+        if len(buffer) >= self.buffer_rows:
+            self._flush(currency)
+
+    # External function writing out and closing the dumps of every currency whose period has ended, including
+    # rows still buffered below buffer_rows (called after every round)
+    def rotate(self):
+        period = self._period(self.clock())
+        for currency in list(self._periods):
+            if self._periods[currency] < period:
+                self._endPeriod(currency)
+
+    # External function writing every buffered row and closing every open dump file
+    def close(self):
+        for currency in self.keywords:
+            self._flush(currency)
+        for currency in list(self._dumps):
+            self._closeDump(currency)
+        self._periods = {}
+
+    # Internal function returning start of the rotation period containing a time
+    # _period(now = float)
+    def _period(self, now):
+        return now - now % self.rotate_seconds
+
+    # Internal function writing a currency's buffered rows and closing its dump at the end of their period
+    # _endPeriod(currency = string)
+    def _endPeriod(self, currency):
+        self._flush(currency)
+        if currency in self._dumps:
+            self._closeDump(currency)
+        self._periods.pop(currency, None)
+
+    # Internal function running one search for a currency (run in a pool thread, so stats are left to collect)
+    # _search(source = function, currency = string)
+    # returns rows, newest status id collected (since_id when none) and number of statuses already collected
+    def _search(self, source, currency):
+        since_id = self.since_ids[currency]
+        rows = []
+        newest = since_id
+        duplicates = 0
+        try:
+            for status in source(self.keywords[currency], since_id):
+                # sources without since_id support may repeat statuses already collected
+                if since_id is not None and status.id <= since_id:
+                    duplicates += 1
+                    continue
+                rows.append(statusRow(status))
+                if newest is None or status.id > newest:
+                    newest = status.id
+        # exception handling for failed searches (e.g. network errors), searches return the newest statuses
+        # first, so older statuses past the error were never read: since_id is left where it was and the rows
+        # read are dropped, the whole search is run again next round
+        except Exception as error:
+            print "search for {0} failed: {1}".format(currency, error)
+            return [], since_id, duplicates
+        return rows, newest, duplicates
+
+    # Internal function appending the buffered rows of a currency to its open dump file
+    # _flush(currency = string)
+    def _flush(self, currency):
+        buffer = self._buffers[currency]
+        if not buffer:
+            return
+        if currency not in self._dumps:
+            self._openDump(currency)
+        outfile = self._dumps[currency][0]
+        csv.writer(outfile, lineterminator='\n').writerows(buffer)
+        outfile.flush()
+        self.stats['rows_written'] += len(buffer)
+        self._buffers[currency] = []
+
+    # Internal function starting a new dump file for a currency in its partial folder, named for the start of
+    # its period (a numbered suffix is added when a dump of that period already exists, e.g. after a restart)
+    # _openDump(currency = string)
+    def _openDump(self, currency):
+        stem = currency + '_' + datetime.fromtimestamp(self._periods[currency]).strftime('%Y%m%d-%H%M%S')
+        partial_folder = self.folder + '/' + currency + '/' + PARTIAL_FOLDER
+        if not os.path.isdir(partial_folder):
+            os.makedirs(partial_folder)
+        name = stem + '.csv'
+        suffix = 0
+        while os.path.exists(self.folder + '/' + currency + '/' + name) or os.path.exists(partial_folder + '/' + name):
+            suffix += 1
+            name = stem + '-' + str(suffix) + '.csv'
+        partial_path = partial_folder + '/' + name
+        outfile = open(partial_path, 'wb')
+        csv.writer(outfile, lineterminator='\n').writerow(COLUMNS)
+        self._dumps[currency] = [outfile, partial_path, self.folder + '/' + currency + '/' + name]
+
+    # Internal function closing a currency's dump file and moving it next to the other dumps
+    # _closeDump(currency = string)
+    def _closeDump(self, currency):
+        outfile, partial_path, path = self._dumps.pop(currency)
+        outfile.close()
+        os.rename(partial_path, path)
+        self.stats['files'] += 1
+
+    # Internal function moving dump files left partial by an interrupted run next to the other dumps
+    # _recoverPartials(currency = string)
+    def _recoverPartials(self, currency):
+        partial_folder = self.folder + '/' + currency + '/' + PARTIAL_FOLDER
+        if os.path.isdir(partial_folder):
+            for name in sorted(os.listdir(partial_folder)):
+                os.rename(partial_folder + '/' + name, self.folder + '/' + currency + '/' + name)
+
+# External function returning the dump file row of a status in a single pass over its fields
+# statusRow(status = tweepy status object)
+def statusRow(status):
+    author = status.author
+    return [status.id, _text(status.text), status.created_at, status.retweet_count, status.favorite_count,
+            _text(status.source), author.id, _text(author.screen_name), _text(author.name), author.created_at,
+            _text(author.description), author.followers_count, author.friends_count, _text(author.location)]
+
+# Internal function returning text fields as utf-8 bytes for the csv writer (None written as empty)
+# _text(value = string or None)
+def _text(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+# Source searching the twitter API through tweepy, returns at most count statuses per search
+class TweepySource:
+    # TweepySource(api = tweepy.API, count = int, lang = string)
+    # api optional, defaulted to loadApi() with credentials from the environment
+    # count optional, defaulted to 1500, largest number of statuses read per search (as the original scripts)
+    # lang optional, defaulted to 'en', language of statuses searched for
+    def __init__(self, api=None, count=1500, lang='en'):
+        if api is None:
+            api = loadApi()
+        self.api = api
+        self.count = count
+        self.lang = lang
+
+    def __call__(self, query, since_id=None):
+        import tweepy
+        # statuses are yielded one at a time as the cursor pages through results
+        return tweepy.Cursor(self.api.search, q=query, lang=self.lang, since_id=since_id).items(self.count)
+
+# External function returning tweepy API authorized with the credentials in the environment variables
+# TWITTER_CONSUMER_KEY, TWITTER_CONSUMER_SECRET, TWITTER_ACCESS_TOKEN and TWITTER_ACCESS_SECRET
+def loadApi():
+    import tweepy
+    auth = tweepy.OAuthHandler(os.environ['TWITTER_CONSUMER_KEY'], os.environ['TWITTER_CONSUMER_SECRET'])
+    auth.set_access_token(os.environ['TWITTER_ACCESS_TOKEN'], os.environ['TWITTER_ACCESS_SECRET'])
+    # rate limit windows are waited out instead of failing the search
+    return tweepy.API(auth, wait_on_rate_limit=True)
+
+# Source replaying recorded statuses instead of searching twitter, for tests and reruns
+# statuses are read from a json lines file of twitter status json (e.g. tweepy status._json per line)
+class RecordedSource:
+    # RecordedSource(path = string, per_search = int)
+    # per_search optional, defaulted to 100, number of recorded statuses returned by each search
+    # searches for a query only return recorded statuses whose text contains it (case insensitive)
+    def __init__(self, path, per_search=100):
+        self.path = path
+        self.per_search = per_search
+        # file position each query has been replayed up to
+        self._positions = {}
+
+    def __call__(self, query, since_id=None):
+        statuses = []
+        with open(self.path) as infile:
+            infile.seek(self._positions.get(query, 0))
+            for line in iter(infile.readline, ''):
+                if len(statuses) >= self.per_search:
+                    break
+                status = json.loads(line)
+                if query.lower() in status['text'].lower():
+                    statuses.append(RecordedStatus(status))
+            self._positions[query] = infile.tell()
+        return statuses
+
+# Status object built from status json, with the fields statusRow reads (as tweepy parses them)
+class RecordedStatus:
+    # RecordedStatus(status = dict of twitter status json)
+    def __init__(self, status):
+        user = status['user']
+        self.id = status['id']
+        self.text = status['text']
+        self.created_at = datetime.strptime(status['created_at'], TWITTER_TIME)
+        self.retweet_count = status.get('retweet_count', 0)
+        self.favorite_count = status.get('favorite_count', 0)
+        self.source = status.get('source')
+        self.author = _RecordedUser(user)
+
+# Internal user object of a RecordedStatus
+class _RecordedUser:
+    def __init__(self, user):
+        self.id = user['id']
+        self.screen_name = user.get('screen_name')
+        self.name = user.get('name')
+        self.created_at = datetime.strptime(user['created_at'], TWITTER_TIME)
+        self.description = user.get('description')
+        self.followers_count = user.get('followers_count', 0)
+        self.friends_count = user.get('friends_count', 0)
+        self.location = user.get('location')
+
+# External function to collect tweets for a dict of currency : search query into data/csv_dumps
+# CollectTweets(keywords = dict, duration = int, interval = int, rotate_seconds = int, source = function)
+# duration optional, defaulted to 24 hours, seconds to collect for
+# source optional, defaulted to TweepySource()
+def CollectTweets(keywords, duration=24*60*60, interval=60, rotate_seconds=3600, source=None):
+    if source is None:
+        source = TweepySource()
+    collector = TweetCollector(keywords, rotate_seconds=rotate_seconds)
+    stats = collector.collect(source, duration, interval)
+    print "collected {0} tweets into {1} files".format(stats['rows_written'], stats['files'])
+    return stats
+
+if __name__ == '__main__':
+    keywords = {'Bitcoin': 'Bitcoin', 'ETH': 'ethereum', 'Ripple': 'Ripple'}
+    CollectTweets(keywords)
@@ -0,0 +1,161 @@
+# Purpose of program is to translate tweet text into english in batches.  Tweets are grouped
+# by the language noted by the twitter user, identical texts are only sent once, and every
+# translation is memoized in a persistent cache keyed on a hash of the language and text so
+# retweets and repeat exports never reach the translation backend twice.  The backend is any
+# object with a googletrans style translate(list_of_text, src, dest) method returning objects
+# with a .text attribute, so a local stub can stand in for googletrans when testing.  googletrans
+# itself loops over a list and makes one HTTP request per text, so for it batching only groups the
+# calls; the request savings come from the cache and from sending identical texts once.
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# Persistent text-hash -> translation cache with least recently used eviction
+class TranslationCache:
+    # TranslationCache(path = string, max_entries = int)
+    # path optional, defaulted to data/translation_cache.json, None keeps the cache in memory only
+    # max_entries optional, defaulted to 100000, number of translations kept before evicting oldest used
+    def __init__(self, path='data/translation_cache.json', max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path) as infile:
+                # saved as list of [key, translation] pairs from least to most recently used
+                for key, text in json.load(infile):
+                    self._entries[key] = text
+
+    # External function returning cache key for text written in language lang
+    # key(text = string, lang = string)
+    def key(self, text, lang):
+        return hashlib.sha1((lang + u'\x00' + text).encode('utf-8')).hexdigest()
+
+    # External function returning cached translation (None when missing) and marking it recently used
+    # get(key = string)
+    def get(self, key):
+        text = self._entries.pop(key, None)
+        if text is not None:
+            self._entries[key] = text
+        return text
+
+    # External function adding translation to cache, evicting least recently used entries over max_entries
+    # put(key = string, text = string)
+    def put(self, key, text):
+        self._entries.pop(key, None)
+        self._entries[key] = text
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # External function writing cache to path
+    def save(self):
+        if self.path is None:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as outfile:
+            json.dump(list(self._entries.items()), outfile)
+        os.rename(temp_path, self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+class BatchTranslator:
+    # BatchTranslator(backend = translator object, cache = TranslationCache, batch_size = int, dest = string)
+    # backend optional, defaulted to googletrans Translator
+    # batch_size optional, defaulted to 50, number of texts passed to each backend translate() call
+    # stats: backend_calls counts translate() calls, backend_requests the HTTP round trips they made (one per
+    # text, as googletrans sends them, unless the backend has a true batched attribute and sends a list at once)
+    def __init__(self, backend=None, cache=None, batch_size=50, dest='en'):
+        if backend is None:
+            from googletrans import Translator
+            backend = Translator()
+        if cache is None:
+            cache = TranslationCache()
+        self.backend = backend
+        self.cache = cache
+        self.batch_size = batch_size
+        self.dest = dest
+        self.stats = {'tweets': 0, 'cache_hits': 0, 'duplicates': 0, 'backend_texts': 0, 'backend_calls': 0, 
+                      'backend_requests': 0, 'untranslated': 0}
+
+    # External function returning english text for each tweet object, in the order given
+    # translateTweets(tweet_objects = list of twitter objects)
+    def translateTweets(self, tweet_objects):
+        texts = []
+        # language -> cache key -> list of positions in texts waiting on that translation
+        pending = {}
+
+        for tweet_object in tweet_objects:
+            self.stats['tweets'] += 1
+            if 'text' not in tweet_object:
+                print "no text in tweet object"
+                texts.append(u'')
+                continue
+
+            text = tweet_object['text']
+            texts.append(text)
+            try:
+                lang = tweet_object['user']['lang'][:2]
+            except (KeyError, TypeError):
+                continue
+            if lang == self.dest:
+                continue
+
+            key = self.cache.key(text, lang)
+            translation = self.cache.get(key)
+            if translation is not None:
+                self.stats['cache_hits'] += 1
+                texts[-1] = translation
+            else:
+                # identical texts in the same call share a single backend translation
+                positions = pending.setdefault(lang, OrderedDict()).setdefault(key, [])
+                if positions:
+                    self.stats['duplicates'] += 1
+                positions.append(len(texts) - 1)
+
+        for lang, keys in pending.items():
+            self._translateLanguage(lang, keys, texts)
+        return texts
+
+    # External function writing translation cache to disk
+    def save(self):
+        self.cache.save()
+
+    # Internal function sending unique texts of one language to the backend in batches
+    # _translateLanguage(lang = string, keys = OrderedDict of cache key : positions, texts = list being filled)
+    def _translateLanguage(self, lang, keys, texts):
+        keys = list(keys.items())
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i:i + self.batch_size]
+            if self._translateBatch(lang, batch, texts):
+                continue
+            # a single text the backend rejects fails the whole call, so the batch is retried one text at a time
+            # and only the texts that fail on their own are left untranslated
+            failed = batch
+            if len(batch) > 1:
+                failed = [item for item in batch if not self._translateBatch(lang, [item], texts)]
+            for key, positions in failed:
+                print "unable to translate: ", texts[positions[0]]
+            self.stats['untranslated'] += len(failed)
+
+    # Internal function making one backend call for a batch and filling in texts and cache from its translations
+    # _translateBatch(lang = string, batch = list of (cache key, positions), texts = list being filled)
+    # returns False when the backend call fails, leaving texts of the batch untouched
+    def _translateBatch(self, lang, batch, texts):
+        originals = [texts[positions[0]] for key, positions in batch]
+        try:
+            self.stats['backend_calls'] += 1
+            self.stats['backend_requests'] += 1 if getattr(self.backend, 'batched', False) else len(originals)
+            translations = [translated.text for translated in
+                            self.backend.translate(originals, src=lang, dest=self.dest)]
+        # exception handling for when 2 letter language code not recognized by the backend
+        except Exception:
+            return False
+
+        self.stats['backend_texts'] += len(originals)
+        for (key, positions), translation in zip(batch, translations):
+            self.cache.put(key, translation)
+            for position in positions:
+                texts[position] = translation
+        return True